@@ -0,0 +1,79 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Compares CPU time of response compression with bytes sent, for gzip levels and brotli qualities.
+
+Usage:
+    python -m pytest tests/bench_compression.py -s
+"""
+import random
+
+import webapp2
+
+from webapp2_utils import codec
+from webapp2_utils.handlers import base
+
+from . import benchmark
+
+
+class Handler(base.BaseHandler):
+    pass
+
+
+def payload(count=2000):
+    rng = random.Random(0)
+
+    return codec.dumps([
+        {
+            'id': str(index),
+            'title': u'Article {}'.format(rng.randint(0, 10 ** 6)),
+            'tags': rng.sample([u'news', u'sport', u'tech', u'culture', u'science'], 2),
+            'score': rng.random(),
+            'created': '2018-01-{:02d}T12:00:00'.format(rng.randint(1, 28)),
+        }
+        for index in xrange(count)
+    ])
+
+
+def test_bench_compression():
+    handler = Handler(webapp2.Request.blank('/'), webapp2.Response())
+    body = payload()
+
+    benchmark.report('identity {} bytes'.format(len(body)), 0.0, 'response')
+
+    settings = [('gzip', 'COMPRESSION_LEVEL', level) for level in (1, 6, 9)]
+    if base.brotli is not None:
+        settings += [('br', 'BROTLI_QUALITY', quality) for quality in (1, 5, 11)]
+
+    for encoding, setting, value in settings:
+        setattr(handler, setting, value)
+
+        compressed = handler.compress(body, encoding)
+        milliseconds = benchmark.measure(lambda: handler.compress(body, encoding))
+
+        benchmark.report(
+            '{} {}={} {} bytes ({:.1%})'.format(
+                encoding, setting, value, len(compressed), float(len(compressed)) / len(body),
+            ),
+            milliseconds,
+            'response',
+        )
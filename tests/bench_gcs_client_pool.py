@@ -0,0 +1,111 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Compares GCS client created per request with clients reused through `ClientPool`,
+against local fake GCS endpoint with keep-alive connections.
+
+Anonymous clients skip credentials lookup, so the difference to real clients is a lower bound.
+
+Usage:
+    python -m pytest tests/bench_gcs_client_pool.py -s
+"""
+import BaseHTTPServer
+import json
+import SocketServer
+import threading
+
+import google.cloud.storage
+import google.cloud.storage._http
+import pytest
+
+from webapp2_utils.handlers.mixins import gcs
+
+from . import benchmark
+
+
+class FakeGCSHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_GET(self):
+        body = json.dumps({
+            'bucket': 'bench',
+            'name': self.path.split('?')[0].rsplit('/', 1)[-1],
+            'generation': '1',
+            'size': '3',
+        })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGCSServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def fake_gcs(monkeypatch):
+    server = FakeGCSServer(('127.0.0.1', 0), FakeGCSHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    monkeypatch.setattr(
+        google.cloud.storage._http.Connection,
+        'API_BASE_URL',
+        'http://127.0.0.1:{}'.format(server.server_address[1]),
+    )
+
+    yield
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_bench_client_pool(fake_gcs):
+    factory = google.cloud.storage.Client.create_anonymous_client
+    pool = gcs.ClientPool(factory)
+
+    def new_client():
+        return factory().bucket('bench').get_blob('file.json')
+
+    def pooled_client():
+        return pool.get().bucket('bench').get_blob('file.json')
+
+    def checked_out_client():
+        with pool.checkout() as client:
+            return client.bucket('bench').get_blob('file.json')
+
+    assert pooled_client().generation == 1
+    assert checked_out_client().generation == 1
+
+    for name, function in (
+        ('client per request', new_client),
+        ('ClientPool', pooled_client),
+        ('ClientPool.checkout', checked_out_client),
+    ):
+        benchmark.report(name, benchmark.measure(function, number=100), 'request')
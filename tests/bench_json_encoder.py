@@ -0,0 +1,92 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Compares `JsonEncoder` with encoding entities through `to_dict()`
+and throughput of `codec` backends.
+
+Usage:
+    python -m pytest tests/bench_json_encoder.py -s
+"""
+import json
+
+import pytest
+
+from webapp2_utils import codec
+from webapp2_utils.handlers import base
+
+from . import benchmark
+from . import test_json_encoder
+
+
+@pytest.fixture
+def authors(testbed):
+    return [
+        test_json_encoder.Author(
+            id=index,
+            name=u'Author {}'.format(index),
+            address=test_json_encoder.Address(city=u'Berlin'),
+            tags=[u'a', u'b', u'c'],
+        )
+        for index in xrange(1000)
+    ]
+
+
+def test_bench_json_encoder(authors):
+    for name, encoder in (
+        ('to_dict', test_json_encoder.LegacyJsonEncoder),
+        ('serializer', base.JsonEncoder),
+    ):
+        benchmark.report(
+            name,
+            benchmark.measure(lambda: json.dumps(authors, cls=encoder)),
+            '1000 entities',
+        )
+
+
+@pytest.fixture
+def backends():
+    yield codec.BACKENDS
+    codec.set_backend()
+
+
+def test_bench_codec_backends(authors, backends):
+    default = base.JsonEncoder().default
+
+    for name in backends:
+        try:
+            codec.set_backend(name)
+        except ImportError:
+            print('{} is not installed'.format(name))
+            continue
+
+        body = codec.dumps(authors, default=default)
+
+        benchmark.report(
+            '{} dumps'.format(name),
+            benchmark.measure(lambda: codec.dumps(authors, default=default)),
+            '1000 entities',
+        )
+        benchmark.report(
+            '{} loads'.format(name),
+            benchmark.measure(lambda: codec.loads(body)),
+            '1000 entities',
+        )
@@ -0,0 +1,94 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Compares per-request cost of `schema` decorator with `jsonschema.validate`,
+which checks the schema and builds the validator on every call.
+
+Usage:
+    python -m pytest tests/bench_schema.py -s
+"""
+import json
+
+import jsonschema
+import webapp2
+
+from webapp2_utils.handlers import decorators
+
+from . import benchmark
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'name': {'type': 'string', 'minLength': 1},
+        'email': {'type': 'string', 'format': 'email'},
+        'age': {'type': 'integer', 'minimum': 0},
+        'tags': {'type': 'array', 'items': {'type': 'string'}, 'maxItems': 20},
+        'address': {
+            'type': 'object',
+            'properties': {
+                'city': {'type': 'string'},
+                'zip': {'type': 'string', 'pattern': '^[0-9]{5}$'},
+            },
+            'required': ['city'],
+        },
+    },
+    'required': ['name', 'email'],
+}
+
+PAYLOAD = {
+    'name': 'John',
+    'email': 'john@example.com',
+    'age': 30,
+    'tags': ['a', 'b', 'c'],
+    'address': {'city': 'Berlin', 'zip': '10115'},
+}
+
+
+class Handler(object):
+
+    def __init__(self):
+        self.request = webapp2.Request.blank('/', POST=json.dumps(PAYLOAD))
+        self.request.content_type = 'application/json'
+
+
+def test_bench_schema():
+    handler = Handler()
+
+    def post(self):
+        pass
+
+    compiled = decorators.schema(SCHEMA)(post)
+    compiled_fail_fast = decorators.schema(SCHEMA, fail_fast=True)(post)
+
+    def validate(self):
+        jsonschema.validate(self.request.json, SCHEMA)
+
+    for name, function in (
+        ('jsonschema.validate', validate),
+        ('schema', compiled),
+        ('schema fail_fast', compiled_fail_fast),
+    ):
+        benchmark.report(
+            name,
+            benchmark.measure(lambda: function(handler), number=1000),
+            'request',
+        )
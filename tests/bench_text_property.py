@@ -0,0 +1,71 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Compares bytes stored by `TextProperty` with and without compression and cost of decoding them.
+
+Usage:
+    python -m pytest tests/bench_text_property.py -s
+"""
+import random
+
+from webapp2_utils.ndb.properties import TextProperty
+
+from . import benchmark
+
+LOCALES = ('de', 'en', 'fr', 'es', 'it', 'pl', 'nl', 'pt')
+WORDS = (
+    u'lorem', u'ipsum', u'dolor', u'sit', u'amet', u'consectetur', u'adipiscing', u'elit',
+    u'sed', u'do', u'eiusmod', u'tempor', u'incididunt', u'ut', u'labore', u'magna',
+)
+
+
+def translations(words):
+    rng = random.Random(words)
+
+    return {
+        locale: u' '.join(rng.choice(WORDS) for _ in xrange(words))
+        for locale in LOCALES
+    }
+
+
+def test_bench_text_property():
+    for words in (10, 100, 1000):
+        value = translations(words)
+
+        for name, prop in (
+            ('plain', TextProperty()),
+            ('compress level 1', type('Fast', (TextProperty,), {'COMPRESSION_LEVEL': 1})(compress=True)),
+            ('compress level 6', TextProperty(compress=True)),
+            ('compress level 9', type('Small', (TextProperty,), {'COMPRESSION_LEVEL': 9})(compress=True)),
+        ):
+            stored = prop._to_base_type(value)
+
+            benchmark.report(
+                '{} words {} {} bytes'.format(words, name, len(stored)),
+                benchmark.measure(lambda: prop._from_base_type(stored), number=100),
+                'decode',
+            )
+            benchmark.report(
+                '{} words {}'.format(words, name),
+                benchmark.measure(lambda: prop._to_base_type(value), number=100),
+                'encode',
+            )
@@ -0,0 +1,42 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+Helpers of benchmarks in `bench_*.py` modules, which are not collected by default.
+
+Usage:
+    python -m pytest tests/bench_json_encoder.py -s
+"""
+import timeit
+
+
+def measure(function, number=10, repeat=3):
+    """
+    :param function: Function called without arguments
+    :param (int) number: Calls per measurement
+    :param (int) repeat: Number of measurements
+    :return: Best time of one call in milliseconds
+    """
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number * 1000
+
+
+def report(name, milliseconds, unit='call'):
+    print('{:<40} {:>10.3f} ms per {}'.format(name, milliseconds, unit))
@@ -0,0 +1,141 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import pytest
+from google.appengine.api import datastore_errors
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from webapp2_utils.ndb.models.counter import ShardedCounter
+
+
+@pytest.fixture(autouse=True)
+def shards_cache():
+    ShardedCounter._shards_cache.clear()
+    yield
+    ShardedCounter._shards_cache.clear()
+
+
+@pytest.fixture
+def contention(monkeypatch):
+    """Fails every first shard transaction of an increment, records (shards, retries) of calls."""
+    calls = []
+    increment_shard = ShardedCounter._increment_shard_async
+
+    @ndb.tasklet
+    def failing_increment_shard(cls, name, shards, delta, retries):
+        calls.append((shards, retries))
+
+        if len(calls) % 2:
+            raise datastore_errors.TransactionFailedError()
+
+        yield increment_shard(name, shards, delta, retries=retries)
+
+    monkeypatch.setattr(
+        ShardedCounter,
+        '_increment_shard_async',
+        classmethod(failing_increment_shard),
+    )
+
+    return calls
+
+
+def test_increment_and_get_count(testbed):
+    assert ShardedCounter.get_count('views') == 0
+
+    ShardedCounter.increment('views')
+    ShardedCounter.increment('views', 5)
+    ShardedCounter.increment('views', -2)
+    ShardedCounter.increment('other')
+
+    # cached 0 from the first read was offset by increments
+    assert ShardedCounter.get_count('views') == 4
+
+    memcache.flush_all()
+
+    assert ShardedCounter.get_count('views') == 4
+    assert ShardedCounter.get_count('other') == 1
+    assert ShardedCounter.get_by_id('views').shards == ShardedCounter.DEFAULT_SHARDS
+
+
+def test_contention_adds_shards(testbed, contention):
+    ShardedCounter.increment('views')
+
+    assert contention == [(10, 0), (20, ShardedCounter.RETRIES)]
+    assert ShardedCounter.get_by_id('views').shards == 20
+    assert ShardedCounter.get_count('views') == 1
+
+
+def test_shards_are_capped(testbed, contention):
+    ShardedCounter(id='views', shards=150).put()
+
+    ShardedCounter.increment('views')
+    ShardedCounter.increment('views')
+
+    assert contention == [
+        (150, 0),
+        (ShardedCounter.MAX_SHARDS, ShardedCounter.RETRIES),
+        (ShardedCounter.MAX_SHARDS, 0),
+        (ShardedCounter.MAX_SHARDS, ShardedCounter.RETRIES),
+    ]
+    assert ShardedCounter.get_by_id('views').shards == ShardedCounter.MAX_SHARDS
+    assert ShardedCounter.get_count('views') == 2
+
+
+def test_increment_does_not_create_cached_total(testbed):
+    key = ShardedCounter._cache_key('views')
+
+    ShardedCounter.increment('views', 3)
+    assert memcache.get(key) is None
+
+    assert ShardedCounter.get_count('views') == 3
+    assert memcache.get(key) == 3
+
+    ShardedCounter.increment('views', 2)
+    assert memcache.get(key) == 5
+
+    ShardedCounter.increment('views', -4)
+    assert memcache.get(key) == 1
+
+
+def test_add_shards_grows_only_seen_count(testbed):
+    ShardedCounter(id='views', shards=40).put()
+
+    # another caller has already grown the counter from 20
+    assert ShardedCounter.add_shards_async('views', 20).get_result() == 40
+    assert ShardedCounter.get_by_id('views').shards == 40
+
+    assert ShardedCounter.add_shards_async('views', 40).get_result() == 80
+    assert ShardedCounter.get_by_id('views').shards == 80
+
+
+def test_failed_growth_retries_on_current_shards(testbed, contention, monkeypatch):
+
+    @ndb.tasklet
+    def add_shards_async(cls, name, shards=None):
+        raise datastore_errors.TransactionFailedError()
+
+    monkeypatch.setattr(ShardedCounter, 'add_shards_async', classmethod(add_shards_async))
+
+    ShardedCounter.increment('views')
+
+    assert contention == [(10, 0), (10, ShardedCounter.RETRIES)]
+    assert ShardedCounter.get_count('views') == 1
@@ -0,0 +1,71 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import webapp2
+
+from webapp2_utils.handlers import decorators
+from webapp2_utils.handlers import ratelimit
+
+
+def get_response(handler, path='/'):
+    app = webapp2.WSGIApplication([(path, handler)])
+    return app.get_response(path)
+
+
+def test_rate_limits_exceeded_limit_among_several(testbed):
+    calls = []
+
+    class Handler(webapp2.RequestHandler):
+
+        @decorators.rate_limits([
+            (ratelimit.RateLimiter(100, 60, path='global'), lambda self: 'global'),
+            (ratelimit.RateLimiter(1, 60, path='client'), lambda self: 'client'),
+        ])
+        def get(self):
+            calls.append(1)
+            self.response.write('ok')
+
+    assert get_response(Handler).status_int == 200
+    assert get_response(Handler).status_int == 429
+    assert len(calls) == 1
+
+
+def test_rate_limits_overlap_clears_response_of_raising_handler(testbed):
+    calls = []
+
+    class Handler(webapp2.RequestHandler):
+
+        @decorators.rate_limits(
+            [(ratelimit.RateLimiter(1, 60, path='client'), lambda self: 'client')],
+            overlap=True,
+        )
+        def get(self):
+            calls.append(1)
+            self.response.write('secret')
+            self.abort(404)
+
+    assert get_response(Handler).status_int == 404
+
+    response = get_response(Handler)
+
+    assert response.status_int == 429
+    assert 'secret' not in response.body
+    assert len(calls) == 2
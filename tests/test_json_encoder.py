@@ -0,0 +1,105 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import datetime
+import json
+
+from google.appengine.ext import ndb
+
+from webapp2_utils.handlers import base
+
+
+class Address(ndb.Model):
+    city = ndb.StringProperty()
+    location = ndb.GeoPtProperty()
+
+
+class Author(ndb.Model):
+    name = ndb.StringProperty()
+    born = ndb.DateTimeProperty()
+    address = ndb.StructuredProperty(Address)
+    friends = ndb.KeyProperty(repeated=True)
+    tags = ndb.StringProperty(repeated=True)
+
+
+class LegacyJsonEncoder(base.JsonEncoder):
+    """Encoder converting entities with `to_dict()`."""
+
+    def default(self, obj):
+        if isinstance(obj, ndb.Model):
+            data = obj.to_dict()
+            data['id'] = str(obj.key.id())
+            return self.default(data)
+
+        return super(LegacyJsonEncoder, self).default(obj)
+
+
+def encode(data, encoder):
+    return json.loads(json.dumps(data, cls=encoder))
+
+
+def test_model_matches_to_dict(testbed):
+    author = Author(
+        id='john',
+        name=u'John',
+        born=datetime.datetime(1980, 1, 2, 3, 4, 5),
+        address=Address(city=u'Berlin', location=ndb.GeoPt(52.5, 13.4)),
+        friends=[ndb.Key(Author, 'jane'), ndb.Key(Author, 7)],
+        tags=[u'a', u'b'],
+    )
+    author.put()
+
+    assert encode([author], base.JsonEncoder) == encode([author], LegacyJsonEncoder)
+    assert encode(author, base.JsonEncoder) == {
+        'id': 'john',
+        'name': 'John',
+        'born': '1980-01-02T03:04:05',
+        'address': {'city': 'Berlin', 'location': '52.5,13.4'},
+        'friends': ['jane', '7'],
+        'tags': ['a', 'b'],
+    }
+
+
+def test_model_keeps_properties_missing_in_model(testbed):
+
+    class Book(ndb.Model):
+        title = ndb.StringProperty()
+        pages = ndb.IntegerProperty()
+        published = ndb.DateTimeProperty()
+
+    key = Book(
+        title=u'Title',
+        pages=100,
+        published=datetime.datetime(2018, 1, 1),
+    ).put()
+
+    class Book(ndb.Model):
+        title = ndb.StringProperty()
+
+    book = key.get(use_cache=False, use_memcache=False)
+
+    assert encode(book, base.JsonEncoder) == encode(book, LegacyJsonEncoder) == {
+        'id': str(key.id()),
+        'title': 'Title',
+        'pages': 100,
+        'published': '2018-01-01T00:00:00',
+    }
+    assert encode(Book(id=1, title=u'New'), base.JsonEncoder) == {'id': '1', 'title': 'New'}
@@ -0,0 +1,128 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import pytest
+from google.appengine.ext import ndb
+
+from webapp2_utils.ndb import locks
+
+
+class RWLock(locks.RWLock):
+    SLEEP = 0.05
+    SLEEP_MIN = 0.01
+
+
+def run(*futures):
+    ndb.Future.wait_all(futures)
+    return [future.get_result() for future in futures]
+
+
+@ndb.tasklet
+def read(lock, log, name, delay=0, hold=0.1):
+    yield ndb.sleep(delay)
+    yield lock.acquire_read(timeout=5)
+    log.append(('acquire', name))
+    yield ndb.sleep(hold)
+    log.append(('release', name))
+    yield lock.release_read()
+
+
+@ndb.tasklet
+def write(lock, log, name, delay=0, hold=0.1):
+    yield ndb.sleep(delay)
+    yield lock.acquire_write(timeout=5)
+    log.append(('acquire', name))
+    yield ndb.sleep(hold)
+    log.append(('release', name))
+    yield lock.release_write()
+
+
+def test_rwlock_concurrent_readers(testbed):
+    lock = RWLock('readers')
+    log = []
+
+    run(
+        read(lock, log, 'reader-1'),
+        read(lock, log, 'reader-2', delay=0.02),
+    )
+
+    assert log == [
+        ('acquire', 'reader-1'),
+        ('acquire', 'reader-2'),
+        ('release', 'reader-1'),
+        ('release', 'reader-2'),
+    ]
+
+
+def test_rwlock_writer_is_exclusive(testbed):
+    lock = RWLock('exclusive')
+    log = []
+
+    run(
+        write(lock, log, 'writer-1'),
+        read(lock, log, 'reader', delay=0.02),
+        write(lock, log, 'writer-2', delay=0.04),
+    )
+
+    for index in xrange(0, len(log), 2):
+        assert log[index][0] == 'acquire'
+        assert log[index + 1] == ('release', log[index][1])
+
+    assert log[0] == ('acquire', 'writer-1')
+
+
+def test_rwlock_timeout(testbed):
+    lock = RWLock('timeout')
+
+    with lock.read:
+        with pytest.raises(locks.TimeoutError):
+            lock.acquire_write(timeout=0.1).get_result()
+
+        # timed out writer does not block readers
+        lock.acquire_read(timeout=0.1).get_result()
+        lock.release_read().get_result()
+
+    with lock.write:
+        with pytest.raises(locks.TimeoutError):
+            lock.acquire_read(timeout=0.1).get_result()
+
+    with lock.read:
+        pass
+
+
+def test_rwlock_writer_not_starved(testbed):
+    lock = RWLock('starvation')
+    log = []
+
+    # readers keep overlapping, writer waiting after the first one gets the lock before later ones
+    run(
+        read(lock, log, 'reader-1', hold=0.2),
+        write(lock, log, 'writer', delay=0.05),
+        read(lock, log, 'reader-2', delay=0.1, hold=0.2),
+        read(lock, log, 'reader-3', delay=0.15, hold=0.2),
+    )
+
+    assert log[:3] == [
+        ('acquire', 'reader-1'),
+        ('release', 'reader-1'),
+        ('acquire', 'writer'),
+    ]
+    assert log[3] == ('release', 'writer')
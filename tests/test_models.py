@@ -0,0 +1,71 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import pytest
+from google.appengine.ext import ndb
+
+from webapp2_utils import lru
+from webapp2_utils.ndb.models.base import Model
+
+
+class Cached(Model):
+    INSTANCE_CACHE = lru.LRUCache(max_size=10)
+
+    name = ndb.StringProperty()
+
+
+@pytest.fixture
+def bumps(monkeypatch):
+    calls = []
+    Cached.INSTANCE_CACHE.clear()
+    monkeypatch.setattr(Cached, 'bump_cache_generation', classmethod(lambda cls: calls.append(cls)))
+    return calls
+
+
+def test_put_multi_bumps_generation_once(testbed, bumps):
+    keys = ndb.put_multi([Cached(name=u'a'), Cached(name=u'b'), Cached(name=u'c')])
+    assert len(bumps) == 1
+
+    ndb.delete_multi(keys)
+    assert len(bumps) == 2
+
+    Cached(name=u'd').put()
+    assert len(bumps) == 3
+
+
+def test_put_many_bumps_generation_once(testbed, bumps, monkeypatch):
+    monkeypatch.setattr(Cached, 'PUT_BATCH_SIZE', 2)
+
+    Cached.put_many([Cached(name=u'{}'.format(index)) for index in xrange(5)])
+
+    assert len(bumps) == 1
+
+
+def test_transaction_bumps_generation_after_commit(testbed, bumps):
+
+    @ndb.transactional
+    def put():
+        Cached(id='a', name=u'a').put()
+        assert bumps == []
+
+    put()
+
+    assert len(bumps) == 1
@@ -0,0 +1,79 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from webapp2_utils.handlers import ratelimit
+
+
+def test_memcache_key_format(testbed):
+    limiter = ratelimit.RateLimiter(10, 60, path='api')
+
+    assert limiter.memcache_key('1.2.3.4', 10) == '600|1.2.3.4|api'
+
+    assert limiter.allow('1.2.3.4', now=630)
+    assert memcache.get('600|1.2.3.4|api') == 1
+
+
+def test_sliding_window_weights_previous_window(testbed):
+    limiter = ratelimit.RateLimiter(10, 60, path='api')
+    memcache.set(limiter.memcache_key('client', 0), 10)
+
+    # 15 s into the window, previous window overlaps by 75%: 7.5 + current hits
+    assert [limiter.allow('client', now=75) for _ in xrange(3)] == [True, True, False]
+
+    # 45 s into the window, previous window overlaps by 25%: 2.5 + current hits
+    assert [limiter.allow('client', now=105) for _ in xrange(5)] == [True] * 4 + [False]
+
+    # at the start of the next window all 8 hits of this one count
+    assert [limiter.allow('client', now=120) for _ in xrange(3)] == [True, True, False]
+
+
+def test_chunk_reserves_hits(testbed):
+    limiter = ratelimit.RateLimiter(7, 60, path='api', chunk=5)
+    memcache_key = limiter.memcache_key('client', 1)
+
+    assert limiter.allow('client', now=60)
+    assert memcache.get(memcache_key) == 5
+
+    for _ in xrange(4):
+        assert limiter.allow('client', now=60)
+
+    assert memcache.get(memcache_key) == 5
+
+    assert [limiter.allow('client', now=60) for _ in xrange(3)] == [True, True, False]
+    assert memcache.get(memcache_key) == 10
+
+
+def test_fails_open_without_memcache(testbed, monkeypatch):
+
+    def memcache_incr(*args, **kwargs):
+        future = ndb.Future()
+        future.set_result(None)
+        return future
+
+    monkeypatch.setattr(ndb.get_context(), 'memcache_incr', memcache_incr)
+
+    limiter = ratelimit.RateLimiter(0, 60, path='api')
+
+    assert limiter.allow('client', now=60)
+    assert limiter.allow('client', now=60)
@@ -0,0 +1,83 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+"""
+JSON codec used by handlers and ndb properties.
+
+The first installed backend from BACKENDS is used. `simplejson` ships C speedups
+and supports the same `default` and `object_hook` arguments as stdlib `json`.
+
+Usage:
+    from webapp2_utils import codec
+
+    codec.set_backend('json')  # force stdlib
+    body = codec.dumps({'msg': 'my message'})
+"""
+import importlib
+
+BACKENDS = ('simplejson', 'json')
+
+backend = None
+
+
+def set_backend(*names):
+    """
+    Selects first importable JSON module.
+
+    :param names: Module names in order of preference. Default BACKENDS
+    :return: Selected module
+    """
+    global backend
+
+    names = names or BACKENDS
+
+    for name in names:
+        try:
+            backend = importlib.import_module(name)
+        except ImportError:
+            continue
+
+        return backend
+
+    raise ImportError('No JSON backend available: {}'.format(', '.join(names)))
+
+
+def dumps(data, default=None, **kwargs):
+    """
+    Serializes object to JSON string.
+
+    :param data: JSON parsable object
+    :param default: Function converting unsupported objects, e.g. `JsonEncoder().default`
+    """
+    return backend.dumps(data, default=default, **kwargs)
+
+
+def loads(data, object_hook=None):
+    """
+    Deserializes JSON string.
+
+    :param (str) data: JSON body
+    :param object_hook: Function called with every decoded dict
+    """
+    return backend.loads(data, object_hook=object_hook)
+
+
+set_backend()
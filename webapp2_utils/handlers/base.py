@@ -21,12 +21,23 @@
 # THE SOFTWARE.
 import abc
 import datetime
+import gzip
+import io
+import itertools
 import json
 import logging
 
 import webapp2
 from google.appengine.ext import ndb
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from webapp2_utils import codec
+from webapp2_utils.ndb import paginator
+
 
 class JsonEncoder(json.JSONEncoder):
     """
@@ -56,37 +67,242 @@ class JsonEncoder(json.JSONEncoder):
         if isinstance(obj, dict):
             return {key: self.default(value) for key, value in obj.iteritems()}
 
-        if isinstance(obj, ndb.Model):
+        if isinstance(obj, ndb.Expando):
             data = obj.to_dict()
             data['id'] = str(obj.key.id())
             return self.default(data)
 
+        if isinstance(obj, ndb.Model):
+            return ModelSerializer.get(type(obj)).serialize(self, obj)
+
         if isinstance(obj, datetime.datetime):
-            return obj.isoformat() if not self.DATETIME_FORMAT else obj.strftime(self.DATETIME_FORMAT)
+            return self.encode_datetime(obj)
 
         if isinstance(obj, (unicode, str, int, float)) or obj is None:
             return obj
 
         if isinstance(obj, ndb.Key):
-            return str(obj.id())
+            return self.encode_key(obj)
 
         if isinstance(obj, ndb.GeoPt):
-            return obj.__str__()
+            return self.encode_geopt(obj)
 
         return super(JsonEncoder, self).default(obj)
 
+    def encode_datetime(self, value):
+        return value.isoformat() if not self.DATETIME_FORMAT else value.strftime(self.DATETIME_FORMAT)
+
+    def encode_key(self, value):
+        return str(value.id())
+
+    def encode_geopt(self, value):
+        return value.__str__()
+
+    def encode_structured(self, value):
+        return ModelSerializer.get(type(value)).serialize(self, value, with_id=False)
+
+
+class ModelSerializer(object):
+    """
+    Serialization plan compiled once per ndb.Model subclass.
+
+    Every property is mapped to a specialised `JsonEncoder` converter, so entities
+    are encoded in a single pass, without `to_dict()` and its recursive copy.
+    Properties without converter (including `TextProperty.I18NString` values,
+    which are `unicode`) are passed to the JSON encoder as they are.
+
+    Like `to_dict()`, entities keep values stored in datastore for properties
+    which are not defined in the model class.
+
+    Usage:
+        data = ModelSerializer.get(MyModel).serialize(JsonEncoder(), entity)
+    """
+
+    CONVERTERS = (
+        (ndb.StructuredProperty, 'encode_structured'),
+        (ndb.LocalStructuredProperty, 'encode_structured'),
+        (ndb.DateTimeProperty, 'encode_datetime'),
+        (ndb.KeyProperty, 'encode_key'),
+        (ndb.GeoPtProperty, 'encode_geopt'),
+    )
+
+    _plans = {}
+
+    def __init__(self, model_class):
+        self.fields = tuple(
+            (prop._code_name, prop, self.converter(prop))
+            for prop in model_class._properties.itervalues()
+        )
+        self.names = frozenset(model_class._properties)
+
+    @classmethod
+    def get(cls, model_class):
+        """
+        Returns cached serialization plan for the model class.
+
+        :param model_class: ndb.Model subclass
+        :rtype: ModelSerializer
+        """
+        try:
+            return cls._plans[model_class]
+        except KeyError:
+            return cls._plans.setdefault(model_class, cls(model_class))
+
+    def converter(self, prop):
+        """
+        :param prop: ndb.Property instance
+        :return: Name of JsonEncoder method converting property value or None
+        """
+        for prop_class, method in self.CONVERTERS:
+            if isinstance(prop, prop_class):
+                return method
+
+    def serialize(self, encoder, entity, with_id=True):
+        """
+        Converts entity to JSON parsable dict.
+
+        :param (JsonEncoder) encoder: Encoder providing converters
+        :param (ndb.Model) entity: Entity of the plan model class
+        :param (bool) with_id: Adds `id` of the entity key to the result
+        :rtype: dict
+        """
+        data = {}
+
+        for name, prop, method in self.fields:
+
+            try:
+                value = prop._get_value(entity)
+            except ndb.UnprojectedPropertyError:
+                continue
+
+            if method is not None and value is not None:
+                convert = getattr(encoder, method)
+
+                if prop._repeated:
+                    value = [convert(item) for item in value]
+                else:
+                    value = convert(value)
+
+            data[name] = value
+
+        if '_properties' in entity.__dict__:
+            # ndb clones properties of entities loaded with values unknown to the model
+            for name, prop in entity._properties.iteritems():
+                if name not in self.names:
+                    data[prop._code_name] = prop._get_value(entity)
+
+        if with_id:
+            data['id'] = str(entity.key.id())
+
+        return data
+
 
 class BaseHandler(webapp2.RequestHandler):
     """Abstract base handler for Requests Handlers."""
     __metaclass__ = abc.ABCMeta
 
+    JSON_STREAM_BATCH_SIZE = 200  # entities fetched and encoded at once by json_stream_response
+
+    COMPRESSION = False  # compress response body with encoding accepted by the client
+    COMPRESSION_ENCODINGS = ('br', 'gzip')  # in order of preference, br requires brotli module
+    COMPRESSION_MIN_SIZE = 1024  # smaller bodies are sent uncompressed
+    COMPRESSION_LEVEL = 6  # gzip compression level 1-9
+    BROTLI_QUALITY = 5  # brotli quality 0-11
+    COMPRESSION_CONTENT_TYPES = frozenset((
+        'application/json',
+        'application/xml',
+        'text/csv',
+        'text/html',
+        'text/plain',
+    ))
+
     def dispatch(self):
         """
         Dispatches handler and sets content type header to application/json by default.
+        Compresses the response body when COMPRESSION is enabled.
         """
         self.response.content_type = 'application/json'
         super(BaseHandler, self).dispatch()
 
+        if self.COMPRESSION:
+            self.compress_response()
+
+    @webapp2.cached_property
+    def response_encoding(self):
+        """
+        Content encoding negotiated from `Accept-Encoding` request header.
+
+        :return: One of COMPRESSION_ENCODINGS or None
+        """
+        if not self.COMPRESSION:
+            return None
+
+        accepted = {}
+
+        for part in self.request.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = part.partition(';')
+            quality = 1.0
+            params = params.strip()
+
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+
+            accepted[name.strip().lower()] = quality
+
+        for encoding in self.COMPRESSION_ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+
+            if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+                return encoding
+
+        return None
+
+    def add_vary_accept_encoding(self):
+        vary = tuple(self.response.vary or ())
+
+        if 'Accept-Encoding' not in vary:
+            self.response.vary = vary + ('Accept-Encoding',)
+
+    def compress_response(self):
+        """
+        Compresses response body with negotiated encoding and sets `Vary` header.
+        """
+        self.add_vary_accept_encoding()
+
+        encoding = self.response_encoding
+
+        if (
+            encoding is None or
+            self.response.content_encoding or
+            self.response.content_type not in self.COMPRESSION_CONTENT_TYPES or
+            len(self.response.body) < self.COMPRESSION_MIN_SIZE
+        ):
+            return
+
+        self.response.body = self.compress(self.response.body, encoding)
+        self.response.content_encoding = encoding
+
+    def compress(self, data, encoding):
+        """
+        :param (str) data: Raw body
+        :param (str) encoding: `br` or `gzip`
+        :return: Compressed body
+        """
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.BROTLI_QUALITY)
+
+        buf = io.BytesIO()
+
+        # zero mtime keeps output deterministic, so md5 ETag stays stable
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=self.COMPRESSION_LEVEL, mtime=0) as gzip_file:
+            gzip_file.write(data)
+
+        return buf.getvalue()
+
     def handle_exception(self, exception, debug):
         if isinstance(exception, webapp2.HTTPException):
             self.response.status_int = exception.code
@@ -94,7 +310,7 @@ class BaseHandler(webapp2.RequestHandler):
         logging.exception(exception)
 
         self.response.write(
-            json.dumps(
+            codec.dumps(
                 {
                     'error': u'{}'.format(exception)
                 }
@@ -110,7 +326,62 @@ class BaseHandler(webapp2.RequestHandler):
         """
         self.response.headers['Content-Type'] = 'application/json'
         self.response.status_int = status
-        self.response.write(json.dumps(data, cls=JsonEncoder))
+        self.response.write(codec.dumps(data, default=JsonEncoder().default))
+
+    def json_stream_response(self, data, status=200, batch_size=None):
+        """
+        Writes JSON array to the response batch by batch.
+
+        Items are encoded and written per batch, so the whole result is never kept
+        as one Python structure and one JSON string. For ndb.Query the next batch
+        is fetched asynchronously while the current one is encoded.
+
+        :param data: ndb.Query or iterable of JSON parsable objects.
+        :param (int) status: HTTP status code. Default 200
+        :param (int) batch_size: Number of items per batch. Default JSON_STREAM_BATCH_SIZE
+        """
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.status_int = status
+
+        default = JsonEncoder().default
+        separator = ''
+
+        self.response.write('[')
+
+        for batch in self.iter_batches(data, batch_size or self.JSON_STREAM_BATCH_SIZE):
+            if not batch:
+                continue
+
+            # encode whole batch at once and drop the enclosing brackets
+            self.response.write(separator + codec.dumps(batch, default=default)[1:-1])
+            separator = ','
+
+        self.response.write(']')
+
+    @staticmethod
+    def iter_batches(data, batch_size):
+        """
+        Yields lists of items from ndb.Query or iterable.
+
+        For ndb.Query the next page is requested before the current one is yielded.
+
+        :param data: ndb.Query or iterable
+        :param (int) batch_size: Max number of items in the batch
+        """
+        if isinstance(data, ndb.Query):
+            for page in paginator.Paginator(data, batch_size):
+                yield page.items
+
+            return
+
+        iterator = iter(data)
+
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                return
+
+            yield batch
 
     def xml_response(self, data, status=200):
         """
@@ -20,12 +20,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 import functools
+import hashlib
 import logging
 import time
 
 from google.appengine.api import memcache
 import webob.exc
 
+from webapp2_utils import lru
+from webapp2_utils.handlers import ratelimit
+
 
 def cache_control(
     max_age=None,
@@ -70,35 +74,65 @@ def rate_limit(
     seconds,
     path='',
     key=lambda self: self.request.remote_addr,
+    chunk=1,
 ):
     """
     Limits request calls
 
     :param limit: Defines max number of request to the handler
-    :param seconds: Time in seconds to define timestamp in memcache_key
-                    of cache by formula: timestamp - timestamp % seconds
+    :param seconds: Length of the sliding window in seconds, memcache counters use
+                    timestamp of fixed windows: timestamp - timestamp % seconds
     :param path: Path used for unique memcache key combined with timestamp and key
     :param key: Part of memcache_key. Default remote address of the request
+    :param chunk: Number of requests reserved from memcache at once and counted locally.
+                  Default 1: one memcache RPC per request
     """
 
+    return rate_limits([
+        (ratelimit.RateLimiter(limit, seconds, path=path, chunk=chunk), key),
+    ])
+
+
+def rate_limits(limits, overlap=False):
+    """
+    Limits request calls with several limits checked in one batched memcache call
+
+    Usage:
+        @rate_limits([
+            (RateLimiter(10, 60, path='ip'), lambda self: self.request.remote_addr),
+            (RateLimiter(1000, 60, path='global'), lambda self: 'global'),
+        ])
+
+    :param limits: Iterable of (ratelimit.RateLimiter, key function) pairs
+    :param overlap: Runs the handler while limits are checked and discards its response
+                    when any limit is exceeded. Use only for handlers without side effects.
+    """
+
+    limits = tuple(limits)
+
     def decorator(f):
 
         @functools.wraps(f)
         def wrapper(self, *args, **kwargs):
 
-            timestamp = long(time.time())
-            timestamp = timestamp - timestamp % seconds
+            now = time.time()
+            futures = [
+                limiter.allow_async(key(self), now)
+                for limiter, key in limits
+            ]
+
+            if overlap:
+                try:
+                    f(self, *args, **kwargs)
+                finally:
+                    # exceeded limit wins over errors raised by the handler, e.g. abort(404)
+                    if not all([future.get_result() for future in futures]):
+                        self.response.clear()
+                        raise webob.exc.HTTPTooManyRequests()
 
-            rate = memcache.incr(
-                '{timestamp}|{key}|{path}'.format(
-                    key=key(self),
-                    path=path,
-                    timestamp=timestamp,
-                ),
-                initial_value=0,
-            )
+                return
 
-            if rate > limit:
+            if not all([future.get_result() for future in futures]):
                 raise webob.exc.HTTPTooManyRequests()
 
             f(self, *args, **kwargs)
@@ -108,11 +142,16 @@ def rate_limit(
     return decorator
 
 
-def schema(schema):
+def schema(schema, format_checker=None, fail_fast=False):
     """
     Validate Request's Payload with provided JSON Schema
 
+    Schema is checked and its validator is built once, when the method is decorated.
+
     :param (dict) schema: JSON schema with fields specification
+    :param format_checker: `jsonschema.FormatChecker` instance or True for the default one.
+                           Default None: `format` keyword is not validated
+    :param (bool) fail_fast: Raises first found error instead of the most relevant one
 
     API Reference for schema format:
         https://pypi.org/project/jsonschema/
@@ -120,6 +159,22 @@ def schema(schema):
 
     import jsonschema
 
+    if format_checker is True:
+        format_checker = jsonschema.FormatChecker()
+
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    validator = validator_class(schema, format_checker=format_checker)
+
+    def validate(data):
+        if fail_fast:
+            validator.validate(data)
+            return
+
+        error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+        if error is not None:
+            raise error
+
     def decorator(f):
 
         @functools.wraps(f)
@@ -133,7 +188,7 @@ def schema(schema):
                 except ValueError as e:
                     raise jsonschema.ValidationError(e.message)
 
-            jsonschema.validate(data, schema)
+            validate(data)
 
             f(self, *args, **kwargs)
 
@@ -142,6 +197,150 @@ def schema(schema):
     return decorator
 
 
+class MemoizeStats(object):
+    """Hit and miss counters of memoized function."""
+
+    def __init__(self):
+        self.local_hits = 0
+        self.memcache_hits = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.local_hits + self.memcache_hits
+
+    def __repr__(self):
+        return 'MemoizeStats(local_hits={}, memcache_hits={}, misses={})'.format(
+            self.local_hits,
+            self.memcache_hits,
+            self.misses,
+        )
+
+
+def memoize(
+    ttl=60,
+    key=lambda *args, **kwargs: (args, sorted(kwargs.items())),
+    local_size=256,
+    local_ttl=None,
+    use_memcache=True,
+    negative_ttl=None,
+):
+    """
+    Caches results of expensive computations in in-process LRU and memcache
+
+    Decorated function gets `stats` (MemoizeStats) and `invalidate(*args, **kwargs)` attributes.
+
+    Usage:
+        @memoize(ttl=300, key=lambda country: country)
+        def top_products(country):
+            return Product.query(Product.country == country).order(-Product.sales).fetch(10)
+
+    :param ttl: Time to live of results in seconds
+    :param key: Function called with the arguments, its repr is part of memcache key.
+                Default all arguments
+    :param local_size: Max number of results in in-process LRU. 0 disables the LRU
+    :param local_ttl: Time to live of results in the LRU. Default ttl
+    :param use_memcache: Enables memcache tier
+    :param negative_ttl: Time to live of None results. Default ttl, 0 disables caching of None
+    """
+
+    def decorator(f):
+
+        prefix = 'memoize|{}.{}|'.format(f.__module__, f.__name__)
+        local = lru.LRUCache(max_size=local_size) if local_size else None
+        stats = MemoizeStats()
+
+        def cache_key(*args, **kwargs):
+            return prefix + hashlib.md5(repr(key(*args, **kwargs))).hexdigest()
+
+        def value_ttl(value):
+            if value is None and negative_ttl is not None:
+                return negative_ttl
+
+            return ttl
+
+        def set_local(memcache_key, cached, cached_ttl):
+            if local is not None and cached_ttl:
+                local.set(memcache_key, cached, min(local_ttl or cached_ttl, cached_ttl))
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+
+            memcache_key = cache_key(*args, **kwargs)
+
+            # values are wrapped in tuple, so cached None is not a miss
+            if local is not None:
+                cached = local.get(memcache_key)
+                if cached is not None:
+                    stats.local_hits += 1
+                    return cached[0]
+
+            if use_memcache:
+                cached = memcache.get(memcache_key)
+                if cached is not None:
+                    stats.memcache_hits += 1
+                    set_local(memcache_key, cached, value_ttl(cached[0]))
+                    return cached[0]
+
+            stats.misses += 1
+            value = f(*args, **kwargs)
+            cached_ttl = value_ttl(value)
+
+            set_local(memcache_key, (value,), cached_ttl)
+            if use_memcache and cached_ttl:
+                try:
+                    memcache.set(memcache_key, (value,), time=cached_ttl)
+                except ValueError:  # pickled value over memcache value limit
+                    pass
+
+            return value
+
+        def invalidate(*args, **kwargs):
+            memcache_key = cache_key(*args, **kwargs)
+
+            if local is not None:
+                local.delete(memcache_key)
+            if use_memcache:
+                memcache.delete(memcache_key)
+
+        wrapper.stats = stats
+        wrapper.invalidate = invalidate
+
+        return wrapper
+
+    return decorator
+
+
+def memoize_method(
+    ttl=60,
+    key=lambda self, *args, **kwargs: (args, sorted(kwargs.items())),
+    **options
+):
+    """
+    Same as `memoize` for handler methods, default key ignores the handler instance.
+
+    Cache keys always include the handler class, so methods of the same name
+    in handlers of one module do not share results.
+
+    Usage:
+        class StatsHandler(base.BaseHandler):
+            @memoize_method(ttl=600, key=lambda self: self.request.get('country'))
+            def totals(self):
+                return aggregate_totals(self.request.get('country'))
+
+    :param key: Function called with the handler and the arguments, like `rate_limit` key
+    """
+    return memoize(
+        ttl=ttl,
+        key=lambda self, *args, **kwargs: (
+            type(self).__module__,
+            type(self).__name__,
+            key(self, *args, **kwargs),
+        ),
+        **options
+    )
+
+
 def token_required(token):
     """
     Verifies token sent in request in `X-Auth-Token` header.
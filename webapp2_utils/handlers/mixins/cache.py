@@ -20,11 +20,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 import abc
+import hashlib
+import time
+
+import webapp2
+from google.appengine.api import memcache
+
+from webapp2_utils import lru
 
 
 class PublicCachingMixin(object):
     """
     Abstract class for setting public cache_control, cache_control max_age and s_max_age.
+
+    With SERVER_CACHE enabled whole GET responses are also cached on the server side,
+    in memcache and in-process LRU, and cached responses skip handler dispatch.
+
+    Handlers which implement `cache_validator` get ETag derived from the validator
+    and matching `If-None-Match` requests are answered with 304 before dispatch.
     """
     __metaclass__ = abc.ABCMeta
 
@@ -40,10 +53,231 @@ class PublicCachingMixin(object):
         410,
     ))
 
+    SERVER_CACHE = False  # server side cache of whole responses
+    SERVER_CACHE_TTL_SECONDS = None  # memcache TTL, default CDN_CACHE_TTL_SECONDS
+    SERVER_CACHE_LOCAL_TTL_SECONDS = 5  # in-process TTL, bounds staleness on other instances after invalidation
+    SERVER_CACHE_MEMCACHE_MAX_SIZE = 1000 * 1000  # bigger responses are cached only in process
+    SERVER_CACHE_LRU = lru.LRUCache(max_size=256, max_bytes=32 * 1024 * 1024)
+
     def dispatch(self):
+        etag = None
+
+        if self.request.method == 'GET':
+            etag = self.validator_etag()
+
+            if etag is not None and etag in self.request.if_none_match:
+                self.response.status_int = 304
+                self.set_cache_headers(etag)
+
+                if getattr(self, 'COMPRESSION', False):
+                    self.add_vary_accept_encoding()
+
+                return
+
+            if self.SERVER_CACHE and self.restore_cached_response():
+                return
+
         super(PublicCachingMixin, self).dispatch()
         if self.request.method == 'GET' and self.response.status_int in self.CACHE_STATUS:
-            self.response.cache_control = 'public'
-            self.response.cache_control.max_age = self.CLIENT_CACHE_TTL_SECONDS
-            self.response.cache_control.s_max_age = self.CDN_CACHE_TTL_SECONDS
+            if getattr(self, 'COMPRESSION', False):
+                # when BaseHandler precedes the mixin, ETag and cache have to see compressed body
+                self.compress_response()
+
+            self.set_cache_headers(etag)
+
+            if self.SERVER_CACHE:
+                self.store_cached_response()
+
+    def set_cache_headers(self, etag=None):
+        self.response.cache_control = 'public'
+        self.response.cache_control.max_age = self.CLIENT_CACHE_TTL_SECONDS
+        self.response.cache_control.s_max_age = self.CDN_CACHE_TTL_SECONDS
+
+        if etag is None:
             self.response.md5_etag()
+        else:
+            self.response.etag = etag
+
+    def cache_validator(self):
+        """
+        Cheap value which changes whenever the response changes, computed before the handler runs.
+
+        Usage:
+            def cache_validator(self):
+                return MyModel.last_updated()
+
+            def cache_validator(self):
+                return self.cache_version('my-models')
+
+        :return: Any value with string representation or None to hash the response body
+        """
+        return None
+
+    def validator_etag(self):
+        """
+        :return: ETag derived from `cache_validator` and the request or None
+        """
+        validator = self.cache_validator()
+
+        if validator is None:
+            return None
+
+        value = u'{}|{}'.format(self._response_variant, validator)
+        return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def cache_version(name):
+        """
+        Version counter stored in memcache, to be used as `cache_validator`.
+
+        Missing counter is initialized with current time in milliseconds,
+        so eviction from memcache never brings back an old version.
+
+        :param (str) name: Counter name
+        """
+        key = 'version|{}'.format(name)
+        version = memcache.get(key)
+
+        if version is None:
+            version = long(time.time() * 1000)
+            if not memcache.add(key, version):
+                version = memcache.get(key)
+
+        return version
+
+    @staticmethod
+    def bump_cache_version(name):
+        """
+        Changes version counter, so ETags derived from it do not match anymore.
+
+        :param (str) name: Counter name
+        """
+        return memcache.incr(
+            'version|{}'.format(name),
+            initial_value=long(time.time() * 1000),
+        )
+
+    @staticmethod
+    def response_variant(path, query_string='', locale='', method='GET', encoding=None):
+        """
+        :param (str) path: Request path
+        :param (str) query_string: Request query string
+        :param (str) locale: Request locale
+        :param (str) method: HTTP method
+        :param (str) encoding: Negotiated content encoding
+        :return: Identity of the response among responses of the path
+        """
+        return u'|'.join((method, path, query_string, locale or u'', encoding or u''))
+
+    @classmethod
+    def response_version(cls, path):
+        """
+        Version of all cached responses of the path, see `cache_version`.
+
+        Version is kept in the LRU for SERVER_CACHE_LOCAL_TTL_SECONDS,
+        so LRU hits do not need memcache call.
+        """
+        name = 'response|{}'.format(path)
+        version = cls.SERVER_CACHE_LRU.get(name)
+
+        if version is None:
+            version = cls.cache_version(name)
+            cls.SERVER_CACHE_LRU.set(name, version, cls.SERVER_CACHE_LOCAL_TTL_SECONDS)
+
+        return version
+
+    @classmethod
+    def response_cache_key(cls, path, query_string='', locale='', method='GET', encoding=None):
+        """
+        :return: memcache key of the cached response, see `response_variant`
+        """
+        key = u'{}|{}'.format(
+            cls.response_variant(path, query_string, locale, method, encoding),
+            cls.response_version(path),
+        )
+        return 'response|{}'.format(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    @classmethod
+    def invalidate_cached_response(cls, path):
+        """
+        Invalidates cached responses of the path for all query strings, locales and encodings.
+
+        ..note:
+            Other instances can serve the responses from their LRU
+            for up to SERVER_CACHE_LOCAL_TTL_SECONDS.
+
+        :param (str) path: Request path
+        """
+        name = 'response|{}'.format(path)
+
+        cls.bump_cache_version(name)
+        cls.SERVER_CACHE_LRU.delete(name)
+
+    @property
+    def response_cache_locale(self):
+        return getattr(self, 'locale', None) or self.request.headers.get('Accept-Language', '')
+
+    @webapp2.cached_property
+    def _response_variant(self):
+        return self.response_variant(
+            self.request.path,
+            self.request.query_string,
+            self.response_cache_locale,
+            self.request.method,
+            getattr(self, 'response_encoding', None),
+        )
+
+    @webapp2.cached_property
+    def _response_cache_key(self):
+        return self.response_cache_key(
+            self.request.path,
+            self.request.query_string,
+            self.response_cache_locale,
+            self.request.method,
+            getattr(self, 'response_encoding', None),
+        )
+
+    def restore_cached_response(self):
+        """
+        Writes cached response.
+
+        :return: True if the response was found in cache
+        """
+        key = self._response_cache_key
+        cached = self.SERVER_CACHE_LRU.get(key)
+
+        if cached is None:
+            cached = memcache.get(key)
+            if cached is None:
+                return False
+
+            self.SERVER_CACHE_LRU.set(key, cached, self.SERVER_CACHE_LOCAL_TTL_SECONDS)
+
+        status, headers, body = cached
+
+        self.response.status_int = status
+        self.response.headerlist = list(headers)
+        self.response.body = body
+
+        return True
+
+    def store_cached_response(self):
+        if 'Set-Cookie' in self.response.headers:
+            return
+
+        key = self._response_cache_key
+        body = self.response.body
+        cached = (self.response.status_int, list(self.response.headerlist), body)
+        ttl = self.SERVER_CACHE_TTL_SECONDS or self.CDN_CACHE_TTL_SECONDS
+
+        self.SERVER_CACHE_LRU.set(
+            key, cached, min(ttl, self.SERVER_CACHE_LOCAL_TTL_SECONDS), size=len(body),
+        )
+
+        if len(body) > self.SERVER_CACHE_MEMCACHE_MAX_SIZE:
+            return
+
+        try:
+            memcache.set(key, cached, time=ttl)
+        except ValueError:  # pickled response over memcache value limit
+            pass
@@ -20,25 +20,179 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 import abc
+import collections
+import contextlib
+import hashlib
+import threading
+import time
+import urllib
 
+import google.cloud.exceptions
 import google.cloud.storage
 import webapp2
 
+from google.appengine.api import memcache
 from google.appengine.api.app_identity import app_identity
 from retrying import retry
 
+from webapp2_utils import lru
+
+
+class TransferTimeoutError(Exception):
+    pass
+
+
+class StreamReader(object):
+    """
+    Forward-only file-like object over file-like object or iterable of strings,
+    with `read` and `tell` used by resumable uploads. Unicode strings are encoded to UTF-8.
+    """
+
+    def __init__(self, stream):
+        self._read = getattr(stream, 'read', None)
+        self._pieces = iter(stream) if self._read is None else None
+        self._buffer = ''
+        self._position = 0
+
+    def tell(self):
+        return self._position
+
+    def read(self, size=-1):
+        if self._read is not None:
+            data = self._read(size)
+        else:
+            pieces = [self._buffer]
+            length = len(self._buffer)
+
+            while size < 0 or length < size:
+                piece = next(self._pieces, None)
+                if piece is None:
+                    break
+
+                pieces.append(piece)
+                length += len(piece)
+
+            data = ''.join(
+                piece.encode('utf-8') if isinstance(piece, unicode) else piece
+                for piece in pieces
+            )
+
+            if size >= 0:
+                data, self._buffer = data[:size], data[size:]
+            else:
+                self._buffer = ''
+
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+
+        self._position += len(data)
+
+        return data
+
+
+class ClientPool(object):
+    """
+    Process wide pool of GCS clients.
+
+    Clients are created lazily inside requests and reused by following requests,
+    together with their HTTP connections and credentials.
+    Credentials are refreshed by the client when they expire.
+
+    `get` returns client of the current thread, `checkout` lends idle client
+    to short-lived threads, so they do not create new client each time.
+
+    Usage:
+        pool = ClientPool()
+        pool.get().bucket('my-bucket')
+
+        with pool.checkout() as client:
+            client.bucket('my-bucket')
+
+        pool.reset()  # next `get` in every thread and next `checkout` create new client
+    """
+
+    def __init__(self, factory=google.cloud.storage.Client):
+        """
+        :param factory: Function creating new client
+        """
+        self.factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._idle = []
+
+    def get(self):
+        """
+        :rtype: google.cloud.storage.client.Client
+        """
+        local = self._local
+
+        if getattr(local, 'generation', None) != self._generation:
+            local.client = self.factory()
+            local.generation = self._generation
+
+        return local.client
+
+    @contextlib.contextmanager
+    def checkout(self):
+        """
+        Lends client used by one thread at a time, returned to the pool on exit.
+
+        :rtype: google.cloud.storage.client.Client
+        """
+        with self._lock:
+            generation = self._generation
+            client = self._idle.pop() if self._idle else None
+
+        if client is None:
+            client = self.factory()
+
+        try:
+            yield client
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    self._idle.append(client)
+
+    def reset(self):
+        with self._lock:
+            self._generation += 1
+            self._idle = []
+
 
 class CloudStorageMixin(object):
     """Abstract class to manage the Google Cloud Storage client."""
     __metaclass__ = abc.ABCMeta
 
+    STORAGE_POOL = ClientPool()
+
+    UPLOAD_QUANTUM = 256 * 1024  # resumable upload chunks must be multiple of 256 KB
+    UPLOAD_CHUNK_SIZE = 32 * UPLOAD_QUANTUM
+
+    TRANSFER_WORKERS = 8  # threads of store_many / fetch_many, each with client lent by STORAGE_POOL
+
+    SIGNED_URL_TTL_SECONDS = 3600  # length of expiry buckets, URLs of one bucket share expiration
+    SIGNED_URL_MIN_TTL_SECONDS = 300  # cached URLs are not handed out closer to their expiration
+    SIGNED_URL_LRU = lru.LRUCache(max_size=1024)
+
+    DOWNLOAD_URL = 'https://www.googleapis.com/download/storage/v1/b/{bucket}/o/{name}'
+    READ_CACHE_TTL_SECONDS = 60  # cached objects are revalidated with GCS after TTL
+    READ_CACHE_MEMCACHE_MAX_SIZE = 1000 * 1000  # bigger objects are cached only in process
+    READ_CACHE_LRU = lru.LRUCache(max_size=256, max_bytes=32 * 1024 * 1024)
+
+    @classmethod
+    def reset_storage(cls):
+        """Drops pooled GCS clients, e.g. after credentials were revoked."""
+        cls.STORAGE_POOL.reset()
+
     @property
     def storage(self):
         """
-        Create GCS client for each request.
+        GCS client shared by requests handled by the same thread.
 
         ..note:
-            It's a workaround for NotAllowed exception when calling app_identity methods.
+            Client is created on first access in a request, not on import,
+            which avoids NotAllowed exception when calling app_identity methods.
 
         API Reference:
             https://googlecloudplatform.github.io/google-cloud-python/latest/storage/client.html#google.cloud.storage.client.Client
@@ -46,7 +200,7 @@ class CloudStorageMixin(object):
         :return: Client object
         :rtype: class google.cloud.storage.client.Client
         """
-        return google.cloud.storage.Client()
+        return self.STORAGE_POOL.get()
 
     @abc.abstractproperty
     def folder(self):
@@ -71,7 +225,7 @@ class CloudStorageMixin(object):
     def store(
         self, file_name, file_data,
         content_type='application/octet-stream',
-        directory=None, metadata=None,
+        directory=None, metadata=None, bucket=None,
     ):
         """
         Saves file to Google Cloud Storage bucket.
@@ -81,6 +235,7 @@ class CloudStorageMixin(object):
         :param (str) content_type: File content type. Default: `application/octet-stream`
         :param (str) directory: File folder path in GCS
         :param (dict or None) metadata: File metadata
+        :param bucket: Bucket object of other client. Default: bucket
 
         :return: Blob object
         :rtype: google.cloud.storage.blob.Blob
@@ -88,9 +243,7 @@ class CloudStorageMixin(object):
         ..note:
             When this method fails, is it retried max 3 times.
         """
-        blob_name = u'{}/{}'.format(directory or self.folder, file_name)
-        blob_name = blob_name.encode('utf-8')
-        blob = self.bucket.blob(blob_name)
+        blob = (bucket or self.bucket).blob(self.blob_name(file_name, directory))
 
         if metadata:
             blob.metadata = metadata
@@ -98,3 +251,303 @@ class CloudStorageMixin(object):
         blob.upload_from_string(file_data, content_type)
 
         return blob
+
+    def map_transfers(self, function, items, workers=None, timeout=None):
+        """
+        Calls function for every item on bounded pool of threads.
+
+        HTTP sessions are not safe to share between threads (e.g. credentials refresh),
+        so every transfer borrows client from STORAGE_POOL which no other thread uses meanwhile.
+        Clients are returned to the pool and reused by following calls.
+
+        With timeout the call returns at the latest after `timeout` seconds.
+        Items not finished by then fail with TransferTimeoutError, transfers in flight
+        keep running in daemon threads until their HTTP request ends and their results are dropped.
+
+        :param function: Function called with bucket of the borrowed client and item
+        :param items: Iterable of items
+        :param (int) workers: Max number of threads. Default: TRANSFER_WORKERS
+        :param (float) timeout: Seconds to wait for transfers
+        :return: (results, errors) lists in order of items
+        """
+        items = list(items)
+        results = [None] * len(items)
+        errors = [None] * len(items)
+        finished = [False] * len(items)
+        pending = collections.deque(enumerate(items))
+        deadline = None if timeout is None else time.time() + timeout
+
+        # app_identity is called in the request thread
+        bucket_name = self.bucket.name
+
+        def worker():
+            while deadline is None or time.time() < deadline:
+                try:
+                    index, item = pending.popleft()
+                except IndexError:
+                    return
+
+                try:
+                    with self.STORAGE_POOL.checkout() as client:
+                        results[index] = function(client.bucket(bucket_name), item)
+                except Exception as error:
+                    errors[index] = error
+
+                finished[index] = True
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in xrange(min(workers or self.TRANSFER_WORKERS, len(items)))
+        ]
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        for thread in threads:
+            thread.join(None if deadline is None else max(deadline - time.time(), 0))
+
+        # threads still running after deadline must not change returned lists
+        finished = list(finished)
+
+        return (
+            [result if done else None for result, done in zip(results, finished)],
+            [
+                error if done else TransferTimeoutError(item)
+                for item, error, done in zip(items, errors, finished)
+            ],
+        )
+
+    def store_many(self, files, workers=None, timeout=None, **options):
+        """
+        Saves many files to Google Cloud Storage bucket in parallel.
+
+        Usage:
+            blobs, errors = self.store_many(
+                [('en.json', en_data), ('de.json', de_data)],
+                content_type='application/json',
+                timeout=30,
+            )
+
+        :param files: Iterable of (file_name, file_data) pairs
+        :param (int) workers: Max number of parallel uploads. Default: TRANSFER_WORKERS
+        :param (float) timeout: Seconds to wait for uploads, see `map_transfers`
+        :param options: `store` arguments common for all files, e.g. content_type
+        :return: (blobs, errors) lists in order of files
+        """
+        return self.map_transfers(
+            lambda bucket, item: self.store(item[0], item[1], bucket=bucket, **options),
+            files,
+            workers=workers,
+            timeout=timeout,
+        )
+
+    def fetch_many(self, file_names, directory=None, workers=None, timeout=None):
+        """
+        Downloads many files from Google Cloud Storage bucket in parallel.
+
+        :param file_names: Iterable of file names
+        :param (str) directory: File folder path in GCS
+        :param (int) workers: Max number of parallel downloads. Default: TRANSFER_WORKERS
+        :param (float) timeout: Seconds to wait for downloads, see `map_transfers`
+        :return: (contents, errors) lists in order of file names
+        """
+        return self.map_transfers(
+            lambda bucket, file_name: bucket.blob(
+                self.blob_name(file_name, directory)
+            ).download_as_string(),
+            file_names,
+            workers=workers,
+            timeout=timeout,
+        )
+
+    def signed_url(self, file_name, method='GET', directory=None):
+        """
+        Cached signed URL of the file, see `signed_urls`.
+
+        :param (str) file_name: File name
+        :param (str) method: HTTP method allowed by the URL
+        :param (str) directory: File folder path in GCS
+        :return: Signed URL
+        """
+        return self.signed_urls([file_name], method, directory)[0]
+
+    def signed_urls(self, file_names, method='GET', directory=None, workers=None):
+        """
+        Signed URLs of many files.
+
+        URLs expire at the end of SIGNED_URL_TTL_SECONDS long bucket, so they are cached
+        per (blob, method, expiration) in the LRU of the instance and memcache,
+        valid for at least SIGNED_URL_MIN_TTL_SECONDS. Keys include the bucket name, so handlers
+        with different buckets do not share URLs. Missing URLs are signed in parallel.
+
+        Usage:
+            urls = self.signed_urls([image.file_name for image in images])
+
+        :param file_names: Iterable of file names
+        :param (str) method: HTTP method allowed by the URLs
+        :param (str) directory: File folder path in GCS
+        :param (int) workers: Max number of parallel signing calls. Default: TRANSFER_WORKERS
+        :return: List of signed URLs in order of file names
+        """
+        now = time.time()
+        ttl = self.SIGNED_URL_TTL_SECONDS
+        expiration = (long(now + self.SIGNED_URL_MIN_TTL_SECONDS) // ttl + 1) * ttl
+        cache_until = expiration - self.SIGNED_URL_MIN_TTL_SECONDS
+
+        bucket = self.bucket.name.encode('utf-8')  # blob names are utf-8 encoded
+        names = [self.blob_name(file_name, directory) for file_name in file_names]
+        keys = [
+            'signed_url|{}'.format(
+                hashlib.md5('|'.join((bucket, name, method, str(expiration)))).hexdigest()
+            )
+            for name in names
+        ]
+        urls = dict((key, self.SIGNED_URL_LRU.get(key)) for key in keys)
+
+        missing = [key for key, url in urls.iteritems() if url is None]
+        if missing:
+            urls.update(memcache.get_multi(missing))
+
+        unsigned = dict(
+            (key, name) for key, name in zip(keys, names) if urls[key] is None
+        )
+        if unsigned:
+            signed, errors = self.map_transfers(
+                lambda bucket, name: bucket.blob(name).generate_signed_url(
+                    expiration, method=method,
+                ),
+                unsigned.values(),
+                workers=workers,
+            )
+
+            for error in errors:
+                if error is not None:
+                    raise error
+
+            signed = dict(zip(unsigned.keys(), signed))
+            urls.update(signed)
+            memcache.set_multi(signed, time=cache_until)
+
+        for key in missing:
+            self.SIGNED_URL_LRU.set(key, urls[key], cache_until - now)
+
+        return [urls[key] for key in keys]
+
+    def read_cached(self, file_name, directory=None, ttl=None):
+        """
+        Content of small, frequently read file, cached in the LRU of the instance and memcache.
+
+        Cached content is returned for `ttl` seconds, then revalidated with conditional GET,
+        which downloads the file only when its generation changed.
+
+        Usage:
+            manifest = codec.loads(self.read_cached('manifest.json'))
+
+        :param (str) file_name: File name
+        :param (str) directory: File folder path in GCS
+        :param (int) ttl: Seconds between revalidations. Default: READ_CACHE_TTL_SECONDS
+        :raises google.cloud.exceptions.NotFound: File does not exist
+        :return: File content
+        """
+        name = self.blob_name(file_name, directory)
+        bucket = self.bucket.name
+        key = 'gcs|{}'.format(hashlib.md5('{}/{}'.format(bucket, name)).hexdigest())
+        now = time.time()
+
+        cached = self.READ_CACHE_LRU.get(key)
+        local = cached is not None
+
+        if not local:
+            cached = memcache.get(key)
+
+        if cached is not None and cached[0] > now:
+            if not local:
+                self._cache_read(key, cached, memcache_tier=False)
+
+            return cached[2]
+
+        params = {'alt': 'media'}
+        if cached is not None:
+            params['ifGenerationNotMatch'] = cached[1]
+
+        response = self.storage._http.get(
+            self.DOWNLOAD_URL.format(bucket=bucket, name=urllib.quote(name, safe='')),
+            params=params,
+        )
+
+        if response.status_code == 304:
+            generation, content = cached[1], cached[2]
+        elif response.status_code == 200:
+            generation, content = response.headers.get('X-Goog-Generation'), response.content
+        else:
+            raise google.cloud.exceptions.from_http_response(response)
+
+        self._cache_read(
+            key,
+            (now + (self.READ_CACHE_TTL_SECONDS if ttl is None else ttl), generation, content),
+        )
+
+        return content
+
+    def _cache_read(self, key, entry, memcache_tier=True):
+        """
+        Stores (fresh until, generation, content) entry of `read_cached`.
+        Objects too big for memcache stay only in the LRU, objects too big for the LRU are not cached.
+        """
+        size = len(entry[2])
+        max_bytes = self.READ_CACHE_LRU.max_bytes
+
+        if max_bytes is None or size <= max_bytes:
+            self.READ_CACHE_LRU.set(key, entry, size=size)
+
+        if memcache_tier and size <= self.READ_CACHE_MEMCACHE_MAX_SIZE:
+            try:
+                memcache.set(key, entry)
+            except ValueError:  # pickled entry over memcache value limit
+                pass
+
+    def blob_name(self, file_name, directory=None):
+        """
+        :param (str) file_name: Name of file.
+        :param (str) directory: File folder path in GCS. Default: folder
+        :return: UTF-8 encoded blob name
+        """
+        blob_name = u'{}/{}'.format(directory or self.folder, file_name)
+        return blob_name.encode('utf-8')
+
+    def store_stream(
+        self, file_name, stream,
+        content_type='application/octet-stream',
+        directory=None, metadata=None, chunk_size=None,
+    ):
+        """
+        Saves file to Google Cloud Storage bucket with chunked resumable upload.
+
+        Only one chunk is kept in memory. Upload is done by `google-resumable-media`,
+        which retries requests failed with 429, 5xx or connection errors with exponential backoff.
+
+        :param (str) file_name: Name of file.
+        :param stream: File-like object or iterable of strings
+        :param (str) content_type: File content type. Default: `application/octet-stream`
+        :param (str) directory: File folder path in GCS
+        :param (dict or None) metadata: File metadata
+        :param (int) chunk_size: Chunk size in bytes, rounded up to multiple of 256 KB.
+                                 Default: UPLOAD_CHUNK_SIZE
+
+        :raises google.cloud.exceptions.GoogleCloudError: Upload failed
+        :return: Blob object
+        :rtype: google.cloud.storage.blob.Blob
+        """
+        blob = self.bucket.blob(self.blob_name(file_name, directory))
+
+        if metadata:
+            blob.metadata = metadata
+
+        chunk_size = chunk_size or self.UPLOAD_CHUNK_SIZE
+        blob.chunk_size = -(-chunk_size // self.UPLOAD_QUANTUM) * self.UPLOAD_QUANTUM
+
+        # without size the upload is resumable and streamed chunk by chunk
+        blob.upload_from_file(StreamReader(stream), content_type=content_type)
+
+        return blob
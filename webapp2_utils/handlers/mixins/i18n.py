@@ -21,11 +21,12 @@
 # THE SOFTWARE.
 import abc
 import dateutil.tz
-import json
 import logging
 
 import webapp2_extras.i18n
 
+from webapp2_utils import codec
+
 
 class I18nRequestHandler(object):
     """Internationalization abstract class for Request Handlers."""
@@ -38,7 +39,7 @@ class I18nRequestHandler(object):
 
     def log_request_body(self):
         logging.info(
-            json.dumps(
+            codec.dumps(
                 dict(self.request.headers.iteritems()),
                 indent=2,
             )
@@ -48,8 +49,8 @@ class I18nRequestHandler(object):
     def log_response_body(self):
         try:
             logging.info(
-                json.dumps(
-                    self.response.json,
+                codec.dumps(
+                    codec.loads(self.response.body),
                     indent=2,
                 )
             )
@@ -0,0 +1,146 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import threading
+import time
+
+from google.appengine.ext import ndb
+
+from webapp2_utils import lru
+
+
+class RateLimiter(object):
+    """
+    Sliding window rate limiter backed by memcache counters.
+
+    Rate is estimated as hits in the current fixed window plus hits in the previous
+    window weighted by its overlap with the sliding window, so there are no bursts
+    at window edges. Count of the closed previous window is read once and cached.
+
+    With `chunk` > 1 quota is reserved from memcache in chunks and consumed locally,
+    so most requests are decided without RPC. Quota reserved but not consumed
+    by the instance counts as used until the window closes.
+
+    Memcache calls go through ndb context, so checks of several limiters started
+    together are sent as one batched `offset_multi` (and `get_multi`) RPC.
+
+    Usage:
+        limiter = RateLimiter(100, 60, chunk=10)
+
+        if not limiter.allow(self.request.remote_addr):
+            raise webob.exc.HTTPTooManyRequests()
+    """
+
+    CACHE_SIZE = 1024  # max number of keys tracked locally
+
+    def __init__(self, limit, seconds, path='', chunk=1):
+        """
+        :param (int) limit: Max number of hits in the sliding window
+        :param (int) seconds: Window length in seconds
+        :param (str) path: Part of memcache key, e.g. handler path
+        :param (int) chunk: Number of hits reserved from memcache at once
+        """
+        self.limit = limit
+        self.seconds = seconds
+        self.path = path
+        self.chunk = chunk
+
+        self._lock = threading.Lock()
+        self._previous = lru.LRUCache(max_size=self.CACHE_SIZE, ttl=seconds)
+        self._reservations = lru.LRUCache(max_size=self.CACHE_SIZE, ttl=seconds)
+
+    def memcache_key(self, key, window):
+        return '{timestamp}|{key}|{path}'.format(
+            key=key,
+            path=self.path,
+            timestamp=window * self.seconds,
+        )
+
+    def allow(self, key, now=None):
+        """
+        Registers hit and checks the rate.
+
+        :param key: Client identifier, e.g. remote address
+        :param (float) now: Current timestamp. Default time.time()
+        :return: True if the hit is within the limit
+        """
+        return self.allow_async(key, now).get_result()
+
+    @ndb.tasklet
+    def allow_async(self, key, now=None):
+        now = time.time() if now is None else now
+        window = long(now // self.seconds)
+        overlap = 1.0 - (now % self.seconds) / float(self.seconds)
+
+        current, previous = yield (
+            self.hit_async(key, window),
+            self.previous_count_async(key, window - 1),
+        )
+
+        raise ndb.Return(current + previous * overlap <= self.limit)
+
+    @ndb.tasklet
+    def previous_count_async(self, key, window):
+        memcache_key = self.memcache_key(key, window)
+        count = self._previous.get(memcache_key)
+
+        if count is None:
+            count = (yield ndb.get_context().memcache_get(memcache_key)) or 0
+            self._previous.set(memcache_key, count)
+
+        raise ndb.Return(count)
+
+    @ndb.tasklet
+    def hit_async(self, key, window):
+        """
+        Counts hit in the window.
+
+        :param key: Client identifier
+        :param (int) window: Number of the fixed window
+        :return: Number of hits in the window including this one
+        """
+        memcache_key = self.memcache_key(key, window)
+
+        if self.chunk > 1:
+            with self._lock:
+                reservation = self._reservations.get(memcache_key)
+
+                if reservation is not None and reservation[0] < reservation[1]:
+                    reservation[0] += 1
+                    raise ndb.Return(reservation[0])
+
+        total = yield ndb.get_context().memcache_incr(
+            memcache_key,
+            delta=self.chunk,
+            initial_value=0,
+        )
+
+        if total is None:
+            # memcache is unavailable, do not block requests
+            raise ndb.Return(0)
+
+        first = total - self.chunk + 1
+
+        if self.chunk > 1:
+            with self._lock:
+                self._reservations.set(memcache_key, [first, total])
+
+        raise ndb.Return(first)
@@ -0,0 +1,120 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+    """
+    Thread safe in-process cache bounded by number of entries or their size, with optional TTL.
+
+    Entries live as long as the instance, so they are shared between requests.
+
+    Usage:
+        cache = LRUCache(max_size=100, ttl=60)
+        cache.set('key', 'value')
+        cache.get('key')
+
+        cache = LRUCache(max_bytes=10 * 1024 * 1024)
+        cache.set('key', data, size=len(data))
+    """
+
+    def __init__(self, max_size=256, ttl=None, max_bytes=None):
+        """
+        :param (int) max_size: Max number of entries, least recently used are evicted first
+        :param ttl: Default time to live of entries in seconds. None means no expiration
+        :param (int) max_bytes: Max total size of entries, as passed to `set`. None means no limit
+        """
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def get(self, key, default=None):
+        """
+        :param key: Entry key
+        :param default: Returned when key is missing or expired
+        """
+        with self._lock:
+            try:
+                entry = self._data.pop(key)
+            except KeyError:
+                return default
+
+            expires, value, size = entry
+
+            if expires is not None and expires <= time.time():
+                self.bytes -= size
+                return default
+
+            self._data[key] = entry
+
+        return value
+
+    def set(self, key, value, ttl=None, size=0):
+        """
+        :param key: Entry key
+        :param value: Any Python object
+        :param ttl: Time to live in seconds. Default: ttl of the cache
+        :param (int) size: Size of the value counted against max_bytes
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._pop(key)
+
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # would evict all entries without being kept
+
+            self._data[key] = (expires, value, size)
+            self.bytes += size
+
+            while len(self._data) > self.max_size or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
@@ -19,6 +19,9 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
+import random
+import time
+
 from google.appengine.ext import ndb
 
 
@@ -26,14 +29,95 @@ class TimeoutError(Exception):
     pass
 
 
-class Semaphore(object):
+class Backoff(object):
+    """
+    Exponential backoff with jitter, bounded by wall-clock deadline.
+
+    Usage:
+        backoff = Backoff(0.01, 1.0, timeout=5)
+
+        while not (yield attempt()):
+            yield backoff.sleep()
+    """
+
+    def __init__(self, minimum, maximum, factor=2.0, jitter=0.5, timeout=None):
+        """
+        :param (float) minimum: First delay in seconds
+        :param (float) maximum: Max delay in seconds
+        :param (float) factor: Delay multiplier after each retry
+        :param (float) jitter: Max random fraction subtracted from the delay
+        :param (float) timeout: Seconds after which `sleep` raises TimeoutError
+        """
+        self.delay = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+
+        self.started = time.time()
+        self.finished = None
+        self.deadline = None if timeout is None else self.started + timeout
+        self.retries = 0
+
+    @property
+    def elapsed(self):
+        """Seconds spent waiting."""
+        return (self.finished or time.time()) - self.started
+
+    def stop(self):
+        self.finished = time.time()
+
+    def sleep(self):
+        """
+        :return: ndb future resolved after the delay
+        :raises TimeoutError: When deadline has passed
+        """
+        now = time.time()
+
+        if self.deadline is not None and now >= self.deadline:
+            self.stop()
+            raise TimeoutError
+
+        delay = self.delay * (1.0 - self.jitter * random.random())
+
+        if self.deadline is not None:
+            delay = min(delay, self.deadline - now)
+
+        self.delay = min(self.delay * self.factor, self.maximum)
+        self.retries += 1
+
+        return ndb.sleep(delay)
+
 
-    SLEEP = 1.0
+class Waiting(object):
+    """Backoff settings shared by memcache based primitives."""
+
+    SLEEP = 1.0  # max delay between attempts
+    SLEEP_MIN = 0.01  # first delay between attempts
+    BACKOFF = 2.0  # delay multiplier after each attempt
+    JITTER = 0.5  # max random fraction subtracted from the delay
     DEADLINE = 60
 
+    @classmethod
+    def backoff(cls, timeout=None):
+        """
+        :param (float) timeout: Seconds after which the backoff raises TimeoutError
+        :rtype: Backoff
+        """
+        return Backoff(
+            cls.SLEEP_MIN,
+            cls.SLEEP,
+            factor=cls.BACKOFF,
+            jitter=cls.JITTER,
+            timeout=timeout,
+        )
+
+
+class Semaphore(Waiting):
+
     def __init__(self, key, value):
         self._key = key
         self._value = value
+        self._backoff = None
 
     def __enter__(self):
         self.acquire().get_result()
@@ -41,11 +125,22 @@ class Semaphore(object):
     def __exit__(self, *args):
         self.release().get_result()
 
+    @property
+    def retries(self):
+        """Number of failed attempts of the last acquire."""
+        return self._backoff.retries if self._backoff else 0
+
+    @property
+    def wait_time(self):
+        """Seconds spent in the last acquire."""
+        return self._backoff.elapsed if self._backoff else 0.0
+
     @ndb.tasklet
     def acquire(self, timeout=None):
 
         ctx = ndb.get_context()
         locked = False
+        self._backoff = backoff = self.backoff(timeout)
 
         while not locked:
 
@@ -54,10 +149,11 @@ class Semaphore(object):
             if value is None:
                 locked = yield ctx.memcache_add(
                     self._key,
-                    self._value,
+                    self._value - 1,
                     self.DEADLINE,
                 )
             elif not isinstance(value, int):
+                backoff.stop()
                 raise TimeoutError
             elif value > 0:
                 locked = yield ctx.memcache_cas(
@@ -67,15 +163,10 @@ class Semaphore(object):
                 )
 
             if locked:
+                backoff.stop()
                 raise ndb.Return(self)
 
-            if timeout is not None:
-                if timeout <= 0:
-                    raise TimeoutError
-
-                timeout -= self.SLEEP
-
-            yield ndb.sleep(self.SLEEP)
+            yield backoff.sleep()
 
     @ndb.tasklet
     def release(self):
@@ -88,10 +179,203 @@ class Lock(Semaphore):
         super(Lock, self).__init__(key, 1)
 
 
-class Event(object):
+class MultiSemaphore(Semaphore):
+    """
+    Semaphore over several keys acquired all at once.
 
-    SLEEP = 1.0
-    DEADLINE = 60
+    Each attempt reads all keys with one batched `get_multi` and, if all are available,
+    decrements them with batched `add_multi` / `cas_multi`. When some of them fail,
+    acquired keys are released in one `offset_multi` and the attempt is retried,
+    so locks are never held partially and cannot deadlock.
+
+    Usage:
+        with MultiLock(['order-1', 'order-2', 'stock-7']):
+            ...
+    """
+
+    def __init__(self, keys, value):
+        super(MultiSemaphore, self).__init__(tuple(sorted(set(keys))), value)
+
+    @ndb.tasklet
+    def acquire(self, timeout=None):
+
+        ctx = ndb.get_context()
+        self._backoff = backoff = self.backoff(timeout)
+
+        while True:
+
+            values = yield [
+                ctx.memcache_get(key, for_cas=True)
+                for key in self._key
+            ]
+
+            if any(value is not None and not isinstance(value, int) for value in values):
+                backoff.stop()
+                raise TimeoutError
+
+            if all(value is None or value > 0 for value in values):
+
+                locked = yield [
+                    ctx.memcache_add(key, self._value - 1, self.DEADLINE)
+                    if value is None else
+                    ctx.memcache_cas(key, value - 1, self.DEADLINE)
+                    for key, value in zip(self._key, values)
+                ]
+
+                if all(locked):
+                    backoff.stop()
+                    raise ndb.Return(self)
+
+                acquired = [key for key, key_locked in zip(self._key, locked) if key_locked]
+                if acquired:
+                    yield [ctx.memcache_incr(key) for key in acquired]
+
+            yield backoff.sleep()
+
+    @ndb.tasklet
+    def release(self):
+        ctx = ndb.get_context()
+        yield [ctx.memcache_incr(key) for key in self._key]
+
+
+class MultiLock(MultiSemaphore):
+
+    def __init__(self, keys):
+        super(MultiLock, self).__init__(keys, 1)
+
+
+class RWLock(Waiting):
+    """
+    Reader-writer lock: many readers or one writer at a time.
+
+    State (readers, writer, waiting writers) is kept in one memcache key and changed
+    with CAS. Waiting writers block new readers, so writers are not starved.
+    Every change extends the lease to DEADLINE seconds, like Semaphore.
+
+    Usage:
+        lock = RWLock('catalog')
+
+        with lock.read:
+            ...
+
+        with lock.write:
+            ...
+
+        yield lock.acquire_read(timeout=5)
+    """
+
+    def __init__(self, key):
+        self._key = key
+        self.read = _LockGuard(self.acquire_read, self.release_read)
+        self.write = _LockGuard(self.acquire_write, self.release_write)
+
+    def _store(self, state, new_state):
+        ctx = ndb.get_context()
+
+        if state is None:
+            return ctx.memcache_add(self._key, new_state, self.DEADLINE)
+
+        return ctx.memcache_cas(self._key, new_state, self.DEADLINE)
+
+    @ndb.tasklet
+    def _modify(self, modify):
+        """Applies `modify(readers, writer, waiting)` to existing state."""
+        ctx = ndb.get_context()
+        backoff = self.backoff()
+
+        while True:
+            state = yield ctx.memcache_get(self._key, for_cas=True)
+
+            # expired lease, nothing to release
+            if state is None:
+                return
+
+            if (yield ctx.memcache_cas(self._key, modify(*state), self.DEADLINE)):
+                return
+
+            yield backoff.sleep()
+
+    @ndb.tasklet
+    def acquire_read(self, timeout=None):
+
+        ctx = ndb.get_context()
+        backoff = self.backoff(timeout)
+
+        while True:
+            state = yield ctx.memcache_get(self._key, for_cas=True)
+            readers, writer, waiting = state or (0, 0, 0)
+
+            if not writer and not waiting:
+                if (yield self._store(state, (readers + 1, 0, 0))):
+                    backoff.stop()
+                    raise ndb.Return(self)
+
+            yield backoff.sleep()
+
+    @ndb.tasklet
+    def release_read(self):
+        yield self._modify(
+            lambda readers, writer, waiting: (max(readers - 1, 0), writer, waiting)
+        )
+
+    @ndb.tasklet
+    def acquire_write(self, timeout=None):
+
+        ctx = ndb.get_context()
+        backoff = self.backoff(timeout)
+        registered = False
+
+        try:
+            while True:
+                state = yield ctx.memcache_get(self._key, for_cas=True)
+                readers, writer, waiting = state or (0, 0, 0)
+
+                if not readers and not writer:
+                    if registered:
+                        waiting = max(waiting - 1, 0)
+
+                    if (yield self._store(state, (0, 1, waiting))):
+                        backoff.stop()
+                        raise ndb.Return(self)
+
+                elif not registered:
+                    registered = yield self._store(state, (readers, writer, waiting + 1))
+                    if registered:
+                        continue
+
+                yield backoff.sleep()
+
+        except TimeoutError as error:
+            if registered:
+                yield self._modify(
+                    lambda readers, writer, waiting: (readers, writer, max(waiting - 1, 0))
+                )
+            raise error
+
+    @ndb.tasklet
+    def release_write(self):
+        yield self._modify(
+            lambda readers, writer, waiting: (readers, 0, waiting)
+        )
+
+
+class _LockGuard(object):
+
+    def __init__(self, acquire, release):
+        self.acquire = acquire
+        self.release = release
+
+    def __enter__(self):
+        self.acquire().get_result()
+
+    def __exit__(self, *args):
+        self.release().get_result()
+
+
+class Event(Waiting):
+
+    SLEEP_MIN = 0.05  # first delay between polls
+    BACKOFF = 1.5  # delay multiplier after each poll
 
     def __init__(self, key):
         self._key = key
@@ -102,19 +386,61 @@ class Event(object):
     def is_set(self):
         return ndb.get_context().memcache_get(self._key)
 
+    @classmethod
     @ndb.tasklet
-    def wait(self, timeout=None):
+    def wait_all(cls, events, timeout=None):
+        """
+        Waits until all events are set.
+
+        Each poll reads all pending events with one batched `get_multi`,
+        events found set are not polled again.
+
+        :param events: Iterable of Event
+        :param (float) timeout: Seconds after which TimeoutError is raised
+        :return: List of the events
+        """
+        events = list(events)
+        pending = events
+        ctx = ndb.get_context()
+        backoff = cls.backoff(timeout)
+
+        while pending:
+
+            values = yield [ctx.memcache_get(event._key) for event in pending]
+            pending = [event for event, value in zip(pending, values) if not value]
 
-        while not (yield self.is_set()):
+            if pending:
+                yield backoff.sleep()
 
-            if timeout is not None:
-                if timeout <= 0:
-                    raise TimeoutError
+        raise ndb.Return(events)
 
-                timeout -= self.SLEEP
+    @classmethod
+    @ndb.tasklet
+    def wait_any(cls, events, timeout=None):
+        """
+        Waits until at least one of the events is set.
+
+        :param events: Iterable of Event
+        :param (float) timeout: Seconds after which TimeoutError is raised
+        :return: List of the events found set by the last poll
+        """
+        events = list(events)
+        ctx = ndb.get_context()
+        backoff = cls.backoff(timeout)
+
+        while True:
+
+            values = yield [ctx.memcache_get(event._key) for event in events]
+            done = [event for event, value in zip(events, values) if value]
 
-            yield ndb.sleep(self.SLEEP)
+            if done:
+                raise ndb.Return(done)
 
+            yield backoff.sleep()
+
+    @ndb.tasklet
+    def wait(self, timeout=None):
+        yield self.wait_all([self], timeout)
         raise ndb.Return(self)
 
     @ndb.tasklet
@@ -19,9 +19,267 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
+import threading
+import time
+
+from google.appengine.api import memcache
+from google.appengine.datastore import entity_pb
 from google.appengine.ext import ndb
 
 
 class Model(ndb.Model):
     created = ndb.DateTimeProperty(auto_now_add=True)
     updated = ndb.DateTimeProperty(auto_now=True)
+
+    GET_BATCH_SIZE = 1000  # datastore limit of keys in one get
+    PUT_BATCH_SIZE = 500  # datastore limit of entities in one put
+    DELETE_BATCH_SIZE = 500  # datastore limit of keys in one delete
+
+    # in-process cache shared between requests, e.g. lru.LRUCache(max_bytes=..., ttl=300)
+    # it is invalidated for the whole kind by every put or delete of the kind,
+    # subclasses overriding put or delete hooks have to call super
+    INSTANCE_CACHE = None
+
+    _pending_writes = threading.local()  # puts and deletes in progress by kind
+
+    @classmethod
+    def _cache_generation_key(cls):
+        return 'generation|{}'.format(cls._get_kind())
+
+    @classmethod
+    @ndb.tasklet
+    def cache_generation_async(cls):
+        """
+        Generation of the kind in memcache, read with batched ndb context memcache call.
+
+        Missing generation is initialized with current time in milliseconds,
+        so eviction from memcache never brings back an old generation.
+        """
+        ctx = ndb.get_context()
+        key = cls._cache_generation_key()
+        generation = yield ctx.memcache_get(key)
+
+        if generation is None:
+            generation = long(time.time() * 1000)
+            if not (yield ctx.memcache_add(key, generation)):
+                generation = yield ctx.memcache_get(key)
+
+        raise ndb.Return(generation)
+
+    @classmethod
+    def bump_cache_generation_async(cls):
+        """Invalidates INSTANCE_CACHE of the kind on all instances."""
+        return ndb.get_context().memcache_incr(
+            cls._cache_generation_key(),
+            initial_value=long(time.time() * 1000),
+        )
+
+    @classmethod
+    def bump_cache_generation(cls):
+        """
+        Synchronous `bump_cache_generation_async`, used by put and delete hooks.
+
+        ..note:
+            Batched ndb context call is sent only when the event loop runs again,
+            which may never happen after the last put of a request without `ndb.toplevel`.
+            Hooks call it once for all entities written together, after commit.
+        """
+        return memcache.incr(
+            cls._cache_generation_key(),
+            initial_value=long(time.time() * 1000),
+        )
+
+    @classmethod
+    @ndb.tasklet
+    def get_cached_async(cls, id_, parent=None):
+        """
+        Gets entity from INSTANCE_CACHE if the kind has not changed since it was cached.
+
+        Cached entities are stored serialized, so every call returns a new instance.
+
+        :param id_: Entity id
+        :param (ndb.Key) parent: Parent key
+        :return: Future of entity or None
+        """
+        key = ndb.Key(cls, id_, parent=parent)
+
+        if cls.INSTANCE_CACHE is None:
+            entity = yield key.get_async()
+            raise ndb.Return(entity)
+
+        generation = yield cls.cache_generation_async()
+        cached = cls.INSTANCE_CACHE.get(key)
+
+        if cached is not None and cached[0] == generation:
+            serialized = cached[1]
+            raise ndb.Return(cls._from_pb(entity_pb.EntityProto(serialized)) if serialized else None)
+
+        entity = yield key.get_async()
+        serialized = entity._to_pb().Encode() if entity else ''
+
+        cls.INSTANCE_CACHE.set(key, (generation, serialized), size=len(serialized))
+
+        raise ndb.Return(entity)
+
+    @classmethod
+    def get_cached(cls, id_, parent=None):
+        return cls.get_cached_async(id_, parent=parent).get_result()
+
+    @classmethod
+    def _pending_write_counts(cls):
+        try:
+            return cls._pending_writes.counts
+        except AttributeError:
+            cls._pending_writes.counts = counts = {}
+            return counts
+
+    @classmethod
+    def _write_started(cls):
+        if cls.INSTANCE_CACHE is None:
+            return
+
+        counts = cls._pending_write_counts()
+        kind = cls._get_kind()
+        count, transaction = counts.get(kind, (0, None))
+
+        # pre hooks run in context of the caller, post hooks in callbacks of the RPC
+        ctx = ndb.get_context()
+        if ctx.in_transaction():
+            transaction = ctx
+
+        counts[kind] = (count + 1, transaction)
+
+    @classmethod
+    def _write_finished(cls, key):
+        """
+        Bumps generation when the last of writes started together finishes,
+        e.g. once for `put_multi`, after commit when in transaction.
+        """
+        if cls.INSTANCE_CACHE is None:
+            return
+
+        cls.INSTANCE_CACHE.delete(key)
+
+        counts = cls._pending_write_counts()
+        kind = cls._get_kind()
+        count, transaction = counts.pop(kind, (1, None))
+
+        if count > 1:
+            counts[kind] = (count - 1, transaction)
+            return
+
+        if transaction is not None:
+            # readers must not cache entity written before commit under new generation
+            transaction.call_on_commit(cls.bump_cache_generation)
+        else:
+            cls.bump_cache_generation()
+
+    def _pre_put_hook(self):
+        self._write_started()
+
+    def _post_put_hook(self, future):
+        self._write_finished(self.key)
+
+    @classmethod
+    def _pre_delete_hook(cls, key):
+        cls._write_started()
+
+    @classmethod
+    def _post_delete_hook(cls, key, future):
+        cls._write_finished(key)
+
+    @staticmethod
+    @ndb.tasklet
+    def _run_batches_async(method, items, batch_size, **ctx_options):
+        """
+        Calls ndb `*_multi_async` method for batches of items, all batches run concurrently.
+
+        :return: Future of (results, errors) lists in order of items,
+                 failed item has None result and its exception in errors
+        """
+        futures = []
+
+        for start in xrange(0, len(items), batch_size):
+            futures.extend(method(items[start:start + batch_size], **ctx_options))
+
+        results = []
+        errors = []
+
+        for future in futures:
+            try:
+                result = yield future
+            except Exception as error:
+                results.append(None)
+                errors.append(error)
+            else:
+                results.append(result)
+                errors.append(None)
+
+        raise ndb.Return((results, errors))
+
+    @classmethod
+    def get_by_ids_async(cls, ids, parent=None, **ctx_options):
+        """
+        Gets entities by ids in concurrent batches.
+
+        Usage:
+            entities, errors = MyModel.get_by_ids_async([1, 2, 3]).get_result()
+
+        :param ids: List of ids
+        :param (ndb.Key) parent: Parent key of all entities
+        :return: Future of (entities, errors) lists in order of ids, missing entity is None
+        """
+        keys = [ndb.Key(cls, id_, parent=parent) for id_ in ids]
+        return cls._run_batches_async(ndb.get_multi_async, keys, cls.GET_BATCH_SIZE, **ctx_options)
+
+    @classmethod
+    def get_by_ids(cls, ids, parent=None, **ctx_options):
+        return cls.get_by_ids_async(ids, parent=parent, **ctx_options).get_result()
+
+    @classmethod
+    def put_many_async(cls, entities, **ctx_options):
+        """
+        Puts entities in concurrent batches.
+
+        :param entities: List of entities
+        :return: Future of (keys, errors) lists in order of entities
+        """
+        return cls._run_batches_async(ndb.put_multi_async, list(entities), cls.PUT_BATCH_SIZE, **ctx_options)
+
+    @classmethod
+    def put_many(cls, entities, **ctx_options):
+        return cls.put_many_async(entities, **ctx_options).get_result()
+
+    @classmethod
+    def delete_many_async(cls, keys, **ctx_options):
+        """
+        Deletes entities in concurrent batches.
+
+        :param keys: List of keys or entities
+        :return: Future of (results, errors) lists in order of keys
+        """
+        keys = [key.key if isinstance(key, ndb.Model) else key for key in keys]
+        return cls._run_batches_async(ndb.delete_multi_async, keys, cls.DELETE_BATCH_SIZE, **ctx_options)
+
+    @classmethod
+    def delete_many(cls, keys, **ctx_options):
+        return cls.delete_many_async(keys, **ctx_options).get_result()
+
+    @classmethod
+    def last_updated(cls, query=None):
+        """
+        Returns `updated` of the most recently saved entity, e.g. as a cheap cache validator.
+
+        ..note:
+            Deleted entities are not reflected. Queries with filters need a composite
+            index on the filtered properties and descending `updated`.
+
+        :param (ndb.Query) query: Query of the model. Default all entities
+        :rtype: datetime.datetime or None
+        """
+        if query is None:
+            query = cls.query()
+
+        entity = query.order(-cls.updated).get(projection=[cls.updated])
+
+        return entity.updated if entity else None
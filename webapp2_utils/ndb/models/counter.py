@@ -0,0 +1,195 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+import random
+
+from google.appengine.api import datastore_errors
+from google.appengine.ext import ndb
+
+from webapp2_utils import lru
+from webapp2_utils.ndb.models.base import Model
+
+
+class ShardedCounterShard(ndb.Model):
+    """Single shard of ShardedCounter, each shard is its own entity group."""
+
+    count = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class ShardedCounter(Model):
+    """
+    Counter spread over shards to allow high write rates, entity id is counter name.
+
+    Increment runs in transaction on random shard. When the transaction collides
+    with another write, number of shards is multiplied by SHARDS_GROWTH (up to MAX_SHARDS)
+    and increment is retried on a random shard. Total is cached in memcache.
+
+    Usage:
+        ShardedCounter.increment('views|article-1')
+        ShardedCounter.get_count('views|article-1')
+    """
+
+    DEFAULT_SHARDS = 10
+    MAX_SHARDS = 200
+    SHARDS_GROWTH = 2
+    CACHE_SECONDS = 60  # memcache TTL of total count
+    RETRIES = 3  # transaction retries after contention was detected
+
+    _shards_cache = lru.LRUCache(max_size=1024, ttl=60)
+
+    shards = ndb.IntegerProperty(default=DEFAULT_SHARDS, indexed=False)
+
+    @staticmethod
+    def _cache_key(name):
+        return 'counter|{}'.format(name)
+
+    @staticmethod
+    def _shard_key(name, index):
+        return ndb.Key(ShardedCounterShard, '{}|{}'.format(name, index))
+
+    @classmethod
+    @ndb.tasklet
+    def shards_count_async(cls, name):
+        shards = cls._shards_cache.get(name)
+
+        if shards is None:
+            counter = yield cls.get_or_insert_async(name)
+            shards = counter.shards
+            cls._shards_cache.set(name, shards)
+
+        raise ndb.Return(shards)
+
+    @classmethod
+    @ndb.tasklet
+    def _increment_shard_async(cls, name, shards, delta, retries):
+
+        key = cls._shard_key(name, random.randint(0, shards - 1))
+
+        @ndb.tasklet
+        def txn():
+            shard = yield key.get_async()
+            if shard is None:
+                shard = ShardedCounterShard(key=key)
+
+            shard.count += delta
+            yield shard.put_async()
+
+        yield ndb.transaction_async(txn, retries=retries)
+
+    @classmethod
+    @ndb.tasklet
+    def add_shards_async(cls, name, shards=None):
+        """
+        Multiplies number of shards by SHARDS_GROWTH, up to MAX_SHARDS.
+
+        Counter entity is written only when it still has the number of shards seen
+        by the caller, so a burst of colliding increments grows it once and callers
+        who see it already grown do not run transaction on it at all.
+
+        :param (str) name: Counter name
+        :param (int) shards: Number of shards seen by the caller. Default: grow unconditionally
+        :return: Future of new number of shards
+        """
+        if shards is not None:
+            counter = yield cls.get_by_id_async(name, use_cache=False)
+
+            if counter is not None and counter.shards != shards:
+                cls._shards_cache.set(name, counter.shards)
+                raise ndb.Return(counter.shards)
+
+        @ndb.tasklet
+        def txn():
+            counter = yield cls.get_by_id_async(name)
+            if counter is None:
+                counter = cls(id=name)
+
+            if shards is not None and counter.shards != shards:
+                raise ndb.Return(counter.shards)
+
+            counter.shards = min(counter.shards * cls.SHARDS_GROWTH, cls.MAX_SHARDS)
+            yield counter.put_async()
+            raise ndb.Return(counter.shards)
+
+        new_shards = yield ndb.transaction_async(txn, retries=0)
+        cls._shards_cache.set(name, new_shards)
+
+        raise ndb.Return(new_shards)
+
+    @classmethod
+    @ndb.tasklet
+    def increment_async(cls, name, delta=1):
+        """
+        :param (str) name: Counter name
+        :param (int) delta: Value added to the counter
+        """
+        shards = yield cls.shards_count_async(name)
+
+        try:
+            yield cls._increment_shard_async(name, shards, delta, retries=0)
+        except datastore_errors.TransactionFailedError:
+            if shards < cls.MAX_SHARDS:
+                try:
+                    shards = yield cls.add_shards_async(name, shards)
+                except datastore_errors.TransactionFailedError:
+                    pass  # counter entity is being grown by another caller
+
+            yield cls._increment_shard_async(name, shards, delta, retries=cls.RETRIES)
+
+        # total is updated only when cached, missing total is summed from shards on read
+        ctx = ndb.get_context()
+        if delta >= 0:
+            yield ctx.memcache_incr(cls._cache_key(name), delta)
+        else:
+            yield ctx.memcache_decr(cls._cache_key(name), -delta)
+
+    @classmethod
+    def increment(cls, name, delta=1):
+        cls.increment_async(name, delta).get_result()
+
+    @classmethod
+    @ndb.tasklet
+    def get_count_async(cls, name):
+        """
+        :param (str) name: Counter name
+        :return: Future of total count, cached in memcache for CACHE_SECONDS
+        """
+        ctx = ndb.get_context()
+        total = yield ctx.memcache_get(cls._cache_key(name))
+
+        if total is None:
+            counter = yield cls.get_by_id_async(name)
+            total = 0
+
+            if counter is not None:
+                entities = yield ndb.get_multi_async([
+                    cls._shard_key(name, index)
+                    for index in xrange(counter.shards)
+                ])
+
+                total = sum(entity.count for entity in entities if entity)
+
+            yield ctx.memcache_add(cls._cache_key(name), total, cls.CACHE_SECONDS)
+
+        raise ndb.Return(total)
+
+    @classmethod
+    def get_count(cls, name):
+        return cls.get_count_async(name).get_result()
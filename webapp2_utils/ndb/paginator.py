@@ -0,0 +1,141 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2018 stanwood GmbH
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+from google.appengine.ext import ndb
+
+
+class Page(object):
+    """Page of query results."""
+
+    def __init__(self, items, cursor, more):
+        self.items = items
+        self.cursor = cursor
+        self.more = more
+
+    @property
+    def next_token(self):
+        """URL-safe cursor of the next page or None for the last page."""
+        if self.more and self.cursor:
+            return self.cursor.urlsafe()
+
+        return None
+
+
+class Paginator(object):
+    """
+    Cursor paginator of ndb query which fetches next page while current one is processed.
+
+    Usage:
+        for page in Paginator(MyModel.query().order(MyModel.created), page_size=500):
+            process(page.items)
+
+        page = Paginator(MyModel.query(), 20).page(self.request.get('cursor'))
+        self.json_response({'items': page.items, 'cursor': page.next_token})
+
+        results = yield Paginator(MyModel.query()).map_async(process_page_async)
+    """
+
+    def __init__(self, query, page_size=100, **query_options):
+        """
+        :param (ndb.Query) query: Query to paginate
+        :param (int) page_size: Number of entities per page
+        :param query_options: Options of `fetch_page_async`, e.g. keys_only
+        """
+        self.query = query
+        self.page_size = page_size
+        self.query_options = query_options
+
+    def fetch_page_async(self, token=None):
+        """
+        :param (str) token: URL-safe cursor. Default first page
+        :return: Future of (items, cursor, more)
+        :raises datastore_errors.BadValueError: When token is invalid
+        """
+        cursor = ndb.Cursor(urlsafe=token) if token else None
+
+        return self.query.fetch_page_async(
+            self.page_size,
+            start_cursor=cursor,
+            **self.query_options
+        )
+
+    def _next_page_async(self, cursor, more):
+        if more and cursor:
+            return self.query.fetch_page_async(
+                self.page_size,
+                start_cursor=cursor,
+                **self.query_options
+            )
+
+        return None
+
+    @ndb.tasklet
+    def page_async(self, token=None):
+        items, cursor, more = yield self.fetch_page_async(token)
+        raise ndb.Return(Page(items, cursor, more))
+
+    def page(self, token=None):
+        """
+        :param (str) token: URL-safe cursor. Default first page
+        :rtype: Page
+        """
+        return self.page_async(token).get_result()
+
+    def iter_pages(self, token=None):
+        """
+        Yields pages, next page is requested before current one is yielded.
+
+        :param (str) token: URL-safe cursor of the first page
+        """
+        future = self.fetch_page_async(token)
+
+        while future is not None:
+            items, cursor, more = future.get_result()
+            future = self._next_page_async(cursor, more)
+
+            yield Page(items, cursor, more)
+
+    def __iter__(self):
+        return self.iter_pages()
+
+    @ndb.tasklet
+    def map_async(self, callback, token=None):
+        """
+        Calls callback with every page while next page is fetched.
+
+        :param callback: Function called with Page, can return future
+        :param (str) token: URL-safe cursor of the first page
+        :return: Future of list of callback results
+        """
+        future = self.fetch_page_async(token)
+        results = []
+
+        while future is not None:
+            items, cursor, more = yield future
+            future = self._next_page_async(cursor, more)
+
+            result = callback(Page(items, cursor, more))
+            if isinstance(result, ndb.Future):
+                result = yield result
+
+            results.append(result)
+
+        raise ndb.Return(results)
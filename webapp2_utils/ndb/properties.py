@@ -19,27 +19,46 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
-import json
+import zlib
 
 import webapp2_extras.i18n
 
 from google.appengine.ext import ndb
 
+from webapp2_utils import codec
+
 
 class TextProperty(ndb.BlobProperty):
+    """
+    Translated text stored as JSON object with locales as keys.
+
+    Values are I18NString in the language of current request, with all translations in `i18n`.
+
+    With `compress=True` JSON bodies of at least `compress_min_size` bytes are stored
+    zlib compressed, prefixed with ZLIB_MARKER. Values without the marker are read
+    as plain JSON, so existing entities stay readable.
+
+    Usage:
+        class Article(Model):
+            title = TextProperty()
+            body = TextProperty(compress=True)
+    """
+
+    ZLIB_MARKER = '\x00'  # JSON never starts with NUL byte
+    COMPRESSION_LEVEL = 6
+
+    _compress = False
+    _compress_min_size = 512
+    _attributes = ndb.BlobProperty._attributes + ['_compress', '_compress_min_size']
 
     class I18NString(unicode):
 
-        def __new__(cls, kwargs):
+        __slots__ = ('i18n',)
 
-            try:
-                locale = webapp2_extras.i18n.get_i18n().locale
-            except AssertionError:
-                locale = ''
+        def __new__(cls, kwargs, locale=None):
 
-            if locale:
-                locale = locale.replace('_', '-').lower()
-                locale = locale.split('-')[0]
+            if locale is None:
+                locale = TextProperty.current_locale()
 
             try:
                 value = kwargs[locale]
@@ -54,22 +73,77 @@ class TextProperty(ndb.BlobProperty):
 
             return self
 
+        def __reduce__(self):
+            return TextProperty.I18NString, (self.i18n,)
+
         def __getitem__(self, key):
             return self.i18n.get(key, None)
 
         def __setitem__(self, key, value):
             self.i18n[key] = value
 
-    def _from_base_type(self, value):
+    def __init__(self, *args, **kwargs):
+        self._compress = kwargs.pop('compress', False)
+        self._compress_min_size = kwargs.pop('compress_min_size', self._compress_min_size)
+        super(TextProperty, self).__init__(*args, **kwargs)
+
+    @staticmethod
+    def current_locale():
+        """
+        Normalized locale is cached on the i18n object of the request until its locale changes.
+
+        :return: Language of current request, e.g. `de` for `de_DE`
+        """
+        try:
+            i18n = webapp2_extras.i18n.get_i18n()
+        except AssertionError:
+            return ''
+
+        locale = i18n.locale
+        cached = getattr(i18n, '_normalized_locale', None)
 
-        return json.loads(
+        if cached is not None and cached[0] == locale:
+            return cached[1]
+
+        normalized = ''
+        if locale:
+            normalized = locale.replace('_', '-').lower().split('-')[0]
+
+        i18n._normalized_locale = (locale, normalized)
+
+        return normalized
+
+    @classmethod
+    def decode(cls, value, locale=None):
+        """
+        Decodes JSON with all objects as I18NString.
+
+        :param (str) value: JSON body
+        :param (str) locale: Normalized locale. Default current_locale()
+        """
+        if locale is None:
+            locale = cls.current_locale()
+
+        return codec.loads(
             value,
-            object_hook=TextProperty.I18NString,
+            object_hook=lambda kwargs: TextProperty.I18NString(kwargs, locale=locale),
         )
 
+    def _from_base_type(self, value):
+
+        if value.startswith(self.ZLIB_MARKER):
+            value = zlib.decompress(value[1:])
+
+        return self.decode(value)
+
     def _to_base_type(self, value):
 
         if isinstance(value, TextProperty.I18NString):
             value = value.i18n
 
-        return json.dumps(value)
+        value = codec.dumps(value)
+
+        if self._compress and len(value) >= self._compress_min_size:
+            value = self.ZLIB_MARKER + zlib.compress(value, self.COMPRESSION_LEVEL)
+
+        return value